@@ -1,9 +1,81 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from neo4j import GraphDatabase
-from datetime import datetime
+from neo4j.exceptions import DriverError, Neo4jError
+from datetime import datetime, time
+from typing import List, NamedTuple, Optional
+import logging
+import os
+
+from cache import MISSING, CacheBackend, LRUCache
 
 app = FastAPI()
+logger = logging.getLogger(__name__)
+
+# Parsed operating hours per organization. set_times invalidates its own entry;
+# the TTL bounds how long another worker's change can go unseen.
+ORG_HOURS_CACHE_SIZE = int(os.environ.get("ORG_HOURS_CACHE_SIZE", "10000"))
+ORG_HOURS_CACHE_TTL = float(os.environ.get("ORG_HOURS_CACHE_TTL", "60"))  # seconds
+hours_cache: CacheBackend = LRUCache(maxsize=ORG_HOURS_CACHE_SIZE, ttl=ORG_HOURS_CACHE_TTL)
+
+# Bulk check-ins are written with one UNWIND query per chunk, each chunk in its own transaction.
+BULK_CHECKIN_CHUNK_SIZE = 1000
+MAX_BULK_CHECKIN_ENTRIES = int(os.environ.get("MAX_BULK_CHECKIN_ENTRIES", "20000"))
+
+SCHEMA = [
+    "CREATE CONSTRAINT person_id IF NOT EXISTS FOR (p:Person) REQUIRE p.id IS UNIQUE",
+    "CREATE CONSTRAINT organization_id IF NOT EXISTS FOR (o:Organization) REQUIRE o.id IS UNIQUE",
+]
+
+class OrganizationHours(NamedTuple):
+    # The stored "HH:MM" strings, kept to detect stale cache entries, and their parsed times.
+    opening_time: Optional[str]
+    closing_time: Optional[str]
+    opening: Optional[time]
+    closing: Optional[time]
+
+    @property
+    def is_set(self):
+        return self.opening is not None and self.closing is not None
+
+    def is_open(self, at: time):
+        return self.opening <= at <= self.closing
+
+def parse_hour(value):
+    return None if value is None else datetime.strptime(value, "%H:%M").time()
+
+def minute_of(moment: datetime):
+    # Hours are compared at minute resolution, matching the "HH:MM" they are stored as,
+    # in server local time like datetime.now(); naive datetimes are taken as local already.
+    if moment.tzinfo is not None:
+        moment = moment.astimezone()
+    return time(moment.hour, moment.minute)
+
+def current_minute():
+    return minute_of(datetime.now())
+
+def hours_from(record):
+    opening_time, closing_time = record["opening_time"], record["closing_time"]
+    return OrganizationHours(opening_time, closing_time, parse_hour(opening_time), parse_hour(closing_time))
+
+def check_in_batch(tx, rows):
+    result = tx.run(
+        """
+        UNWIND $rows AS row
+        OPTIONAL MATCH (org:Organization {id: row.org_id})
+        OPTIONAL MATCH (u:Person {id: row.user_id})
+        WITH row, org, u,
+             coalesce(org.opening_time = row.opening_time AND org.closing_time = row.closing_time, false) AS hours_current
+        CALL {
+            WITH org, u, hours_current
+            WITH org, u WHERE u IS NOT NULL AND hours_current
+            MERGE (u)-[:CHECKED_IN]->(org)
+            RETURN count(*) AS checked_in
+        }
+        RETURN row.index AS index, u IS NOT NULL AS person_found, hours_current
+        """, rows=rows
+    )
+    return {record["index"]: record for record in result}
 
 # Neo4j Database connection
 class Neo4jDatabase:
@@ -13,6 +85,12 @@ class Neo4jDatabase:
     def close(self):
         self.driver.close()
 
+    def ensure_schema(self):
+        # Uniqueness constraints double as the indexes behind the Person/Organization id lookups.
+        with self.driver.session() as session:
+            for statement in SCHEMA:
+                session.run(statement).consume()
+
     def set_organization_times(self, org_id, opening_time, closing_time):
         with self.driver.session() as session:
             session.run(
@@ -22,37 +100,100 @@ class Neo4jDatabase:
                 RETURN org
                 """, org_id=org_id, opening_time=opening_time, closing_time=closing_time
             )
-
-    def check_in_user(self, user_id, org_id):
+        hours_cache.delete(org_id)
+
+    def get_hours(self, org_id):
+        """
+        The organization's OrganizationHours, from the cache when possible; None if it does not exist.
+        """
+        hours = hours_cache.get(org_id)
+        if hours is not MISSING:
+            return hours
         with self.driver.session() as session:
-            # Fetch organization's operating hours
             result = session.run(
                 """
                 MATCH (org:Organization {id: $org_id})
                 RETURN org.opening_time AS opening_time, org.closing_time AS closing_time
                 """, org_id=org_id
             ).single()
+        if not result:
+            return None
+        hours = hours_from(result)
+        hours_cache.set(org_id, hours)
+        return hours
+
+    def get_hours_many(self, org_ids):
+        """
+        OrganizationHours by org id for those of `org_ids` that exist, reading the
+        ones not cached with a single query.
+        """
+        found = {}
+        missing = []
+        for org_id in set(org_ids):
+            hours = hours_cache.get(org_id)
+            if hours is MISSING:
+                missing.append(org_id)
+            else:
+                found[org_id] = hours
+        if missing:
+            with self.driver.session() as session:
+                result = session.run(
+                    """
+                    UNWIND $org_ids AS org_id
+                    MATCH (org:Organization {id: org_id})
+                    RETURN org.id AS id, org.opening_time AS opening_time, org.closing_time AS closing_time
+                    """, org_ids=missing
+                )
+                for record in result:
+                    hours = hours_from(record)
+                    hours_cache.set(record["id"], hours)
+                    found[record["id"]] = hours
+        return found
+
+    def check_in_user(self, user_id, org_id, hours):
+        """
+        MERGE the CHECKED_IN edge in one query that also confirms the organization's
+        stored hours are still the `hours` the caller checked. Returns None if the
+        organization is gone, else a record with person_found, hours_current and checked_in.
+        """
+        with self.driver.session() as session:
+            return session.run(
+                """
+                MATCH (org:Organization {id: $org_id})
+                OPTIONAL MATCH (u:Person {id: $user_id})
+                WITH org, u, org.opening_time = $opening_time AND org.closing_time = $closing_time AS hours_current
+                CALL {
+                    WITH org, u, hours_current
+                    WITH org, u WHERE u IS NOT NULL AND hours_current
+                    MERGE (u)-[:CHECKED_IN]->(org)
+                    RETURN count(*) AS checked_in
+                }
+                RETURN u IS NOT NULL AS person_found, hours_current, checked_in > 0 AS checked_in
+                """, user_id=user_id, org_id=org_id,
+                opening_time=hours.opening_time, closing_time=hours.closing_time
+            ).single()
 
-            if not result:
-                raise Exception("Organization not found")
-
-            opening_time = result["opening_time"]
-            closing_time = result["closing_time"]
-            current_time = datetime.now().strftime("%H:%M")
-
-            # Check if current time is within operating hours
-            if not (opening_time <= current_time <= closing_time):
-                raise Exception(f"Organization is closed. Operating hours are {opening_time} to {closing_time}")
-
-            # Create CHECKED_IN relationship
-            result = session.run(
+    def check_out_users(self, org_id, hours):
+        """
+        Delete the CHECKED_IN edges of every non-admin, provided the organization's
+        stored closing time is still the one in `hours` the caller checked. Returns
+        None if the organization is gone, else a record with hours_current and checked_out.
+        """
+        with self.driver.session() as session:
+            return session.run(
                 """
-                MATCH (u:Person {id: $user_id}), (org:Organization {id: $org_id})
-                MERGE (u)-[:CHECKED_IN]->(org)
-                RETURN u
-                """, user_id=user_id, org_id=org_id
-            )
-            return result.single()
+                MATCH (org:Organization {id: $org_id})
+                WITH org, org.closing_time = $closing_time AS hours_current
+                CALL {
+                    WITH org, hours_current
+                    OPTIONAL MATCH (u:Person)-[r:CHECKED_IN]->(org)
+                    WHERE hours_current AND u.role <> 'admin'
+                    DELETE r
+                    RETURN count(r) AS checked_out
+                }
+                RETURN hours_current, checked_out
+                """, org_id=org_id, closing_time=hours.closing_time
+            ).single()
 
 db = Neo4jDatabase(uri="bolt://localhost:7687", user="neo4j", password="password")
 
@@ -66,6 +207,21 @@ class CheckInRequest(BaseModel):
     user_id: int
     org_id: int
 
+class BulkCheckInEntry(BaseModel):
+    user_id: int
+    org_id: int
+    scanned_at: datetime
+
+class BulkCheckInResult(BaseModel):
+    index: int
+    accepted: bool
+    reason: Optional[str] = None
+
+class BulkCheckInResponse(BaseModel):
+    accepted: int
+    rejected: int
+    results: List[BulkCheckInResult]
+
 @app.post("/organization/set-times")
 async def set_times(times: OrganizationTimes):
     """
@@ -85,61 +241,106 @@ async def check_in_user(request: CheckInRequest):
     Check in a user to the organization, verifying operating hours.
     """
     try:
-        with db.driver.session() as session:
-            # Fetch organization's opening and closing times
-            result = session.run(
-                """
-                MATCH (org:Organization {id: $org_id})
-                RETURN org.opening_time AS opening_time, org.closing_time AS closing_time
-                """, org_id=request.org_id
-            ).single()
-
-            if not result:
+        # One retry: a stale cache entry is dropped and the hours re-read once.
+        for _ in range(2):
+            hours = db.get_hours(request.org_id)
+            if hours is None:
                 raise HTTPException(status_code=404, detail="Organization not found")
 
-            opening_time = result["opening_time"]
-            closing_time = result["closing_time"]
-
             # Validate that opening_time and closing_time are set
-            if opening_time is None or closing_time is None:
+            if not hours.is_set:
                 raise HTTPException(
                     status_code=400,
                     detail="Organization's opening and closing times are not set"
                 )
 
-            # Get current time
-            current_time = datetime.now().strftime("%H:%M")
-
-            # Convert times to datetime objects for proper comparison
-            current_time_dt = datetime.strptime(current_time, "%H:%M")
-            opening_time_dt = datetime.strptime(opening_time, "%H:%M")
-            closing_time_dt = datetime.strptime(closing_time, "%H:%M")
-
             # Validate current time against opening and closing times
-            if not (opening_time_dt <= current_time_dt <= closing_time_dt):
+            if not hours.is_open(current_minute()):
                 raise HTTPException(
                     status_code=403,
-                    detail=f"Organization is closed. Operating hours are {opening_time} to {closing_time}"
+                    detail=f"Organization is closed. Operating hours are {hours.opening_time} to {hours.closing_time}"
                 )
 
-            # Create CHECKED_IN relationship if within operating hours
-            result = session.run(
-                """
-                MATCH (u:Person {id: $user_id}), (org:Organization {id: $org_id})
-                MERGE (u)-[:CHECKED_IN]->(org)
-                RETURN u
-                """, user_id=request.user_id, org_id=request.org_id
-            )
-            if not result:
+            # Create CHECKED_IN relationship if the hours checked above are still the stored ones
+            result = db.check_in_user(request.user_id, request.org_id, hours)
+            if result is None or not result["hours_current"]:
+                hours_cache.delete(request.org_id)
+                if result is None:
+                    raise HTTPException(status_code=404, detail="Organization not found")
+                continue
+            if not result["person_found"]:
                 raise HTTPException(status_code=404, detail="User not found")
+            return {"message": "User successfully checked in"}
 
-        return {"message": "User successfully checked in"}
+        raise HTTPException(status_code=409, detail="Organization's operating hours changed during check-in")
 
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+#-----------------------------------------------------------------------------------------------------
+
+@app.post("/organization/checkin/bulk", response_model=BulkCheckInResponse)
+def bulk_check_in(entries: List[BulkCheckInEntry]):
+    """
+    Check in a batch of buffered badge scans. Each entry is checked against its
+    organization's hours at the time of day it was scanned; accepted entries are
+    merged with one UNWIND query per chunk of BULK_CHECKIN_CHUNK_SIZE. Returns the
+    outcome of every entry by its index in the request. Resending a batch is harmless.
+    A plain def, so FastAPI runs its blocking round trips in the threadpool rather
+    than on the event loop.
+    """
+    if len(entries) > MAX_BULK_CHECKIN_ENTRIES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_CHECKIN_ENTRIES} entries per request")
+
+    try:
+        hours_by_org = db.get_hours_many(entry.org_id for entry in entries)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    results = [None] * len(entries)
+    rows = []
+    for index, entry in enumerate(entries):
+        hours = hours_by_org.get(entry.org_id)
+        if hours is None:
+            reason = "Organization not found"
+        elif not hours.is_set:
+            reason = "Organization's opening and closing times are not set"
+        elif not hours.is_open(minute_of(entry.scanned_at)):
+            reason = f"Organization was closed at scan time. Operating hours are {hours.opening_time} to {hours.closing_time}"
+        else:
+            rows.append({"index": index, "user_id": entry.user_id, "org_id": entry.org_id,
+                         "opening_time": hours.opening_time, "closing_time": hours.closing_time})
+            continue
+        results[index] = {"index": index, "accepted": False, "reason": reason}
+
+    with db.driver.session() as session:
+        for start in range(0, len(rows), BULK_CHECKIN_CHUNK_SIZE):
+            chunk = rows[start:start + BULK_CHECKIN_CHUNK_SIZE]
+            try:
+                written = session.execute_write(check_in_batch, chunk)
+            except (Neo4jError, DriverError) as e:
+                # Earlier chunks are committed, so report this one per entry rather than fail the request.
+                for row in chunk:
+                    results[row["index"]] = {"index": row["index"], "accepted": False, "reason": f"Batch failed: {e}"}
+                continue
+            for row in chunk:
+                record = written.get(row["index"])
+                if record is None or not record["hours_current"]:
+                    # The hours changed since they were cached; the entry can be resent.
+                    hours_cache.delete(row["org_id"])
+                    reason = "Organization's operating hours changed during check-in"
+                elif not record["person_found"]:
+                    reason = "User not found"
+                else:
+                    results[row["index"]] = {"index": row["index"], "accepted": True}
+                    continue
+                results[row["index"]] = {"index": row["index"], "accepted": False, "reason": reason}
+
+    accepted = sum(result["accepted"] for result in results)
+    return {"accepted": accepted, "rejected": len(results) - accepted, "results": results}
+
 #-------------------------------------------------------------------------------------------------
 @app.get("/organization/active-users")
 async def get_active_users(org_id: int):
@@ -149,38 +350,20 @@ async def get_active_users(org_id: int):
     :param org_id: The organization ID to retrieve active users.
     """
     try:
-        with db.driver.session() as session:
-            # Fetch organization's opening and closing times
-            times_result = session.run(
-                """
-                MATCH (org:Organization {id: $org_id})
-                RETURN org.opening_time AS opening_time, org.closing_time AS closing_time
-                """, org_id=org_id
-            ).single()
-
-            if not times_result:
-                raise HTTPException(status_code=404, detail="Organization not found")
-
-            opening_time = times_result["opening_time"]
-            closing_time = times_result["closing_time"]
-
-            # Validate that opening_time and closing_time are set
-            if opening_time is None or closing_time is None:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Organization's opening and closing times are not set"
-                )
-
-            # Get current time
-            current_time = datetime.now().strftime("%H:%M")
-
-            # Convert times to datetime objects for proper comparison
-            current_time_dt = datetime.strptime(current_time, "%H:%M")
-            opening_time_dt = datetime.strptime(opening_time, "%H:%M")
-            closing_time_dt = datetime.strptime(closing_time, "%H:%M")
+        hours = db.get_hours(org_id)
+        if hours is None:
+            raise HTTPException(status_code=404, detail="Organization not found")
+
+        # Validate that opening_time and closing_time are set
+        if not hours.is_set:
+            raise HTTPException(
+                status_code=400,
+                detail="Organization's opening and closing times are not set"
+            )
 
+        with db.driver.session() as session:
             # Logic based on current time
-            if opening_time_dt <= current_time_dt <= closing_time_dt:
+            if hours.is_open(current_minute()):
                 # Within operating hours, fetch all active users
                 active_result = session.run(
                     """
@@ -207,6 +390,8 @@ async def get_active_users(org_id: int):
 
             return {"active_users": active_users}
 
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -220,48 +405,35 @@ async def auto_checkout(org_id: int):
     :param org_id: The organization ID for automatic checkout.
     """
     try:
-        with db.driver.session() as session:
-            # Fetch the organization's closing time
-            result = session.run(
-                """
-                MATCH (org:Organization {id: $org_id})
-                RETURN org.closing_time AS closing_time
-                """, {"org_id": org_id}  # Explicitly pass org_id as a parameter
-            ).single()
-
-            if not result:
+        # One retry: a stale cache entry is dropped and the hours re-read once.
+        for _ in range(2):
+            hours = db.get_hours(org_id)
+            if hours is None:
                 raise HTTPException(status_code=404, detail="Organization not found")
 
-            closing_time = result["closing_time"]
-
             # Validate that closing_time is set
-            if closing_time is None:
+            if hours.closing is None:
                 raise HTTPException(
                     status_code=400,
                     detail="Organization's closing time is not set"
                 )
 
-            # Get current time in "HH:MM" format
-            current_time = datetime.now().strftime("%H:%M")
-
-            # Convert times to datetime objects for proper comparison
-            current_time_dt = datetime.strptime(current_time, "%H:%M")
-            closing_time_dt = datetime.strptime(closing_time, "%H:%M")
-
             # Perform checkout only if current time is past the closing time
-            if current_time_dt > closing_time_dt:
-                # Remove CHECKED_IN relationships for all users except admin
-                session.run(
-                    """
-                    MATCH (u:Person)-[r:CHECKED_IN]->(org:Organization {id: $org_id})
-                    WHERE u.role <> 'admin'
-                    DELETE r
-                    """, {"org_id": org_id}  # Explicitly pass org_id as a parameter
-                )
-                return {"message": "All non-admin users have been checked out after closing time"}
-            else:
+            if current_minute() <= hours.closing:
                 return {"message": "It's not past the organization's closing time yet"}
 
+            # Remove CHECKED_IN relationships for all users except admin, if the
+            # closing time checked above is still the stored one
+            result = db.check_out_users(org_id, hours)
+            if result is None or not result["hours_current"]:
+                hours_cache.delete(org_id)
+                if result is None:
+                    raise HTTPException(status_code=404, detail="Organization not found")
+                continue
+            return {"message": "All non-admin users have been checked out after closing time"}
+
+        raise HTTPException(status_code=409, detail="Organization's operating hours changed during checkout")
+
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -301,6 +473,15 @@ async def admin_checkout(org_id: int):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.on_event("startup")
+def startup_event():
+    try:
+        db.ensure_schema()
+    except Exception:
+        # The routes work without the constraints, only slower and without id uniqueness;
+        # if the log shows a constraint error, find the Person/Organization ids in use twice.
+        logger.exception("Schema bootstrap failed")
+
 @app.on_event("shutdown")
 def shutdown_event():
     db.close()
\ No newline at end of file
@@ -1,23 +1,123 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
 from pydantic import BaseModel
-from typing import List
-from neo4j import GraphDatabase
+from typing import List, Optional
+from neo4j import AsyncGraphDatabase
+from neo4j.exceptions import ConstraintError
 from datetime import datetime
+import asyncio
+import logging
+import os
+import time
+
+from cache import MISSING, CacheBackend, LRUCache
+from conditional import etag_matches, make_etag, not_modified
+from cursor import decode_cursor, encode_cursor
+from fastjson import FastJSONResponse
+from social_import import (DEFAULT_BATCH_SIZE, DEFAULT_WORKERS, FIELDS, ImportStats, as_utc, import_rows, iter_lines,
+                           iter_rows)
+from timeline import InMemoryTimelineStore
+from trending import SlidingTopK
+from write_behind import WriteBehind, WriteBehindFull
+import fastjson
 
 app = FastAPI()
+logger = logging.getLogger(__name__)
 
 NEO4J_URI = "bolt://localhost:7687"
 NEO4J_USER = "neo4j"
 NEO4J_PASSWORD = "87654321"
-driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+NEO4J_MAX_POOL_SIZE = int(os.environ.get("NEO4J_MAX_POOL_SIZE", "100"))
+NEO4J_ACQUISITION_TIMEOUT = float(os.environ.get("NEO4J_ACQUISITION_TIMEOUT", "60"))  # seconds
+driver = AsyncGraphDatabase.driver(
+    NEO4J_URI,
+    auth=(NEO4J_USER, NEO4J_PASSWORD),
+    max_connection_pool_size=NEO4J_MAX_POOL_SIZE,
+    connection_acquisition_timeout=NEO4J_ACQUISITION_TIMEOUT,
+)
+
+# Home timelines are fanned out on write, up to TIMELINE_MAX_LENGTH entries per user
+# and TIMELINE_MAX_USERS loaded timelines, least recently read evicted first.
+# Authors above CELEBRITY_FOLLOWER_THRESHOLD followers are not fanned out; their
+# posts are merged in from `authored` when a follower reads the feed.
+TIMELINE_MAX_LENGTH = int(os.environ.get("TIMELINE_MAX_LENGTH", "800"))
+TIMELINE_MAX_USERS = int(os.environ.get("TIMELINE_MAX_USERS", "100000"))
+CELEBRITY_FOLLOWER_THRESHOLD = int(os.environ.get("CELEBRITY_FOLLOWER_THRESHOLD", "10000"))
+timelines = InMemoryTimelineStore(TIMELINE_MAX_LENGTH, TIMELINE_MAX_USERS)
+authored = InMemoryTimelineStore(TIMELINE_MAX_LENGTH, TIMELINE_MAX_USERS)
+celebrities = set()
+
+# Opt-in: with WRITE_BEHIND=1, follows and likes are acknowledged with 202 once
+# queued and written in batches by a background flusher.
+WRITE_BEHIND = os.environ.get("WRITE_BEHIND", "0") == "1"
+
+# Likes per post over sliding windows, counted in TRENDING_BUCKET_SECONDS buckets.
+TRENDING_WINDOWS = {"5m": 300, "1h": 3600, "24h": 86400}
+TRENDING_BUCKET_SECONDS = int(os.environ.get("TRENDING_BUCKET_SECONDS", "60"))
+TRENDING_MAX_K = 100
+trending = SlidingTopK(TRENDING_WINDOWS, TRENDING_BUCKET_SECONDS, TRENDING_MAX_K)
+
+# Friend-of-friend recommendations walk at most RECOMMENDATION_MAX_FRIENDS of the
+# user's followees (a uniform sample when they follow more) and the first
+# RECOMMENDATION_MAX_FANOUT followees of each, so one query touches a bounded number of paths.
+RECOMMENDATION_MAX_K = 50
+RECOMMENDATION_MAX_FRIENDS = int(os.environ.get("RECOMMENDATION_MAX_FRIENDS", "200"))
+RECOMMENDATION_MAX_FANOUT = int(os.environ.get("RECOMMENDATION_MAX_FANOUT", "200"))
+RECOMMENDATION_CACHE_SIZE = int(os.environ.get("RECOMMENDATION_CACHE_SIZE", "100000"))
+RECOMMENDATION_CACHE_TTL = float(os.environ.get("RECOMMENDATION_CACHE_TTL", "3600"))  # seconds
+RECOMMENDATION_PRECOMPUTE_INTERVAL = float(os.environ.get("RECOMMENDATION_PRECOMPUTE_INTERVAL", "0"))  # 0 disables
+RECOMMENDATION_ACTIVE_HOURS = float(os.environ.get("RECOMMENDATION_ACTIVE_HOURS", "24"))
+RECOMMENDATION_PRECOMPUTE_LIMIT = int(os.environ.get("RECOMMENDATION_PRECOMPUTE_LIMIT", "10000"))
+RECOMMENDATION_PRECOMPUTE_CONCURRENCY = 8
+recommendation_cache: CacheBackend = LRUCache(maxsize=RECOMMENDATION_CACHE_SIZE, ttl=RECOMMENDATION_CACHE_TTL)
+
+# Uniqueness constraints also give the MATCH (:User {id: ...}) / (:Post {id: ...})
+# lookups behind every write an index to seek on.
+SCHEMA = [
+    "CREATE CONSTRAINT user_id IF NOT EXISTS FOR (u:User) REQUIRE u.id IS UNIQUE",
+    "CREATE CONSTRAINT post_id IF NOT EXISTS FOR (p:Post) REQUIRE p.id IS UNIQUE",
+    # Lets the startup trending rebuild seek recent likes instead of scanning them all.
+    "CREATE INDEX like_created_at IF NOT EXISTS FOR ()-[r:LIKE]-() ON (r.created_at)",
+    # Range index so time-window post listings are index seeks in (timestamp) order.
+    "CREATE INDEX post_timestamp IF NOT EXISTS FOR (p:Post) ON (p.timestamp)",
+    # With like_created_at, finds recently active users for the recommendation precompute.
+    "CREATE INDEX follow_created_at IF NOT EXISTS FOR ()-[r:FOLLOW]-() ON (r.created_at)",
+]
 
 def get_session():
     return driver.session()
 
+def on_written(kind, rows, created):
+    # Only likes that created an edge count towards trending, as in like_post.
+    if kind == "likes":
+        for row in created:
+            trending.add(row["post_id"])
+    # A new followee's existing posts were never fanned out; reload on next read.
+    # Recommendations computed while the follow was queued are stale as well.
+    elif kind == "follows":
+        for row in created:
+            timelines.discard(row["follower_id"])
+            recommendation_cache.delete(row["follower_id"])
+
+write_behind = WriteBehind(
+    get_session,
+    max_size=int(os.environ.get("WRITE_BEHIND_QUEUE_SIZE", "10000")),
+    batch_size=int(os.environ.get("WRITE_BEHIND_BATCH_SIZE", "500")),
+    flush_interval=float(os.environ.get("WRITE_BEHIND_FLUSH_INTERVAL", "0.05")),  # seconds
+    enqueue_timeout=float(os.environ.get("WRITE_BEHIND_ENQUEUE_TIMEOUT", "1")),  # seconds
+    on_written=on_written,
+)
+
+async def ensure_schema():
+    async with get_session() as session:
+        for statement in SCHEMA:
+            result = await session.run(statement)
+            await result.consume()
+
 class CreatePostRequest(BaseModel):
     id: str
     content: str
-    timestamp: str
+    timestamp: datetime
+    author_id: Optional[str] = None
 
 class CreateUserRequest(BaseModel):
     id: str
@@ -30,7 +130,7 @@ class User(BaseModel):
 class Post(BaseModel):
     id: str
     content: str
-    timestamp: str
+    timestamp: datetime
 
 class FollowResponse(BaseModel):
     message: str
@@ -41,163 +141,925 @@ class UserResponse(User):
 class PostResponse(Post):
     pass
 
-def create_user(user_id: str, name: str):
-    with get_session() as session:
+class UserProjection(BaseModel):
+    id: Optional[str] = None
+    name: Optional[str] = None
+
+USER_FIELDS = ("id", "name")
+EDGE_PAGE_SIZE = 100
+MAX_EDGE_PAGE_SIZE = 1000
+POST_PAGE_SIZE = 50
+TIMESTAMP_MIGRATION_BATCH_SIZE = 5000
+
+class FollowCheck(BaseModel):
+    follows: bool
+    followed_by: bool
+    mutual: bool
+
+class UserCounts(BaseModel):
+    id: str
+    followers: int
+    following: int
+
+class PostCounts(BaseModel):
+    id: str
+    likes: int
+
+class PostPage(BaseModel):
+    items: List[PostResponse]
+    next_cursor: Optional[str] = None
+
+class FeedPost(Post):
+    author_id: str
+
+class FeedPage(BaseModel):
+    items: List[FeedPost]
+    next_cursor: Optional[str] = None
+
+def as_datetime(value) -> Optional[datetime]:
+    """
+    A post timestamp as read back from the graph: a neo4j DateTime, or an ISO
+    string not yet migrated. None if it is neither.
+    """
+    if hasattr(value, "to_native"):
+        value = value.to_native()
+    elif isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    return as_utc(value)
+
+def decode_time_cursor(cursor: str):
+    timestamp, post_id = decode_cursor(cursor, str, str)
+    try:
+        return as_utc(datetime.fromisoformat(timestamp)), post_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def parse_fields(fields: Optional[str]):
+    """
+    The comma-separated `fields` query parameter, checked against what UserResponse exposes.
+    """
+    if fields is None:
+        return USER_FIELDS
+    requested = tuple(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = [field for field in requested if field not in USER_FIELDS]
+    if not requested or unknown:
+        raise HTTPException(status_code=400,
+                            detail=f"fields must be a comma-separated subset of {', '.join(USER_FIELDS)}")
+    return requested
+
+def user_list_response(users, next_cursor: Optional[str], response: Response, if_none_match: Optional[str]):
+    """
+    ETag the projected page; a matching If-None-Match gets a bodiless 304. The
+    cursor for the following page, if any, goes in X-Next-Cursor.
+    """
+    etag = make_etag([users, next_cursor])
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    headers = {"ETag": etag}
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = next_cursor
+    if fastjson.FAST_JSON_RESPONSES:
+        return FastJSONResponse(users, headers=headers)
+    response.headers.update(headers)
+    return users
+
+async def create_user(user_id: str, name: str):
+    async with get_session() as session:
         query = """
         CREATE (u:User {id: $user_id, name: $name})
         RETURN u
         """
-        result = session.run(query, user_id=user_id, name=name)
-        return result.single()
+        result = await session.run(query, user_id=user_id, name=name)
+        return await result.single()
 
-def create_post(post_id: str, content: str, timestamp: str):
-    with get_session() as session:
+async def create_post(post_id: str, content: str, timestamp: datetime):
+    async with get_session() as session:
         query = """
         CREATE (p:Post {id: $post_id, content: $content, timestamp: $timestamp})
         RETURN p
         """
-        result = session.run(query, post_id=post_id, content=content, timestamp=timestamp)
-        return result.single()
+        result = await session.run(query, post_id=post_id, content=content, timestamp=timestamp)
+        return await result.single()
 
-def create_follow(follower_id: str, followee_id: str):
-    with get_session() as session:
+async def create_authored_post(post_id: str, content: str, timestamp: datetime, author_id: str):
+    """
+    Create the post and its POSTED edge, returning the author's follower count and,
+    unless the author is over the celebrity threshold, the follower ids to fan out to.
+    """
+    async with get_session() as session:
+        query = """
+        MATCH (author:User {id: $author_id})
+        CREATE (author)-[:POSTED]->(p:Post {id: $post_id, content: $content, timestamp: $timestamp})
+        WITH author, p, COUNT { (:User)-[:FOLLOW]->(author) } AS follower_count
+        OPTIONAL MATCH (follower:User)-[:FOLLOW]->(author) WHERE follower_count <= $threshold
+        RETURN p, follower_count, collect(follower.id) AS follower_ids
+        """
+        result = await session.run(query, post_id=post_id, content=content, timestamp=timestamp,
+                                   author_id=author_id, threshold=CELEBRITY_FOLLOWER_THRESHOLD)
+        return await result.single()
+
+async def create_follow(follower_id: str, followee_id: str):
+    async with get_session() as session:
         query = """
         MATCH (follower:User {id: $follower_id}), (followee:User {id: $followee_id})
-        CREATE (follower)-[:FOLLOW]->(followee)
+        MERGE (follower)-[r:FOLLOW]->(followee)
+        ON CREATE SET r.created_at = timestamp(),
+                      follower.following_count = coalesce(follower.following_count, 0) + 1,
+                      followee.follower_count = coalesce(followee.follower_count, 0) + 1
         RETURN follower, followee
         """
-        result = session.run(query, follower_id=follower_id, followee_id=followee_id)
-        return result.single()
+        result = await session.run(query, follower_id=follower_id, followee_id=followee_id)
+        return await result.single()
 
-def create_like(user_id: str, post_id: str):
-    with get_session() as session:
+async def create_like(user_id: str, post_id: str):
+    async with get_session() as session:
         query = """
         MATCH (user:User {id: $user_id}), (post:Post {id: $post_id})
-        CREATE (user)-[:LIKE]->(post)
+        MERGE (user)-[r:LIKE]->(post)
+        ON CREATE SET r.created_at = timestamp(), post.like_count = coalesce(post.like_count, 0) + 1
         RETURN user, post
         """
-        result = session.run(query, user_id=user_id, post_id=post_id)
-        return result.single()
+        result = await session.run(query, user_id=user_id, post_id=post_id)
+        # From the server's counters: comparing created_at with timestamp() would also
+        # report an edge another transaction created in the same millisecond.
+        summary = await result.consume()
+        return summary.counters.relationships_created > 0
 
-def get_followers(user_id: str):
-    with get_session() as session:
-        query = """
-        MATCH (follower:User)-[:FOLLOW]->(user:User {id: $user_id})
-        RETURN follower
-        """
+# Edges are listed newest first by created_at, then by the other end's id; edges
+# written before created_at existed sort last, as if created at time 0.
+EDGE_PATTERNS = {
+    "followers": "(node:User)-[r:FOLLOW]->(:User {id: $key})",
+    "following": "(:User {id: $key})-[r:FOLLOW]->(node:User)",
+    "likes": "(node:User)-[r:LIKE]->(:Post {id: $key})",
+}
+
+async def get_edge_page(kind: str, key: str, fields, cursor: Optional[str], limit: int):
+    """
+    One page of the users at the far end of `kind` edges, projected to `fields`.
+    Returns (items, next_cursor).
+    """
+    after_created_at, after_id = decode_cursor(cursor, int, str) if cursor is not None else (None, None)
+    projection = ", ".join(f"node.{field} AS {field}" for field in fields)
+    query = f"""
+    MATCH {EDGE_PATTERNS[kind]}
+    WITH node, coalesce(r.created_at, 0) AS created_at
+    WHERE $after_created_at IS NULL OR created_at < $after_created_at
+       OR (created_at = $after_created_at AND node.id < $after_id)
+    RETURN created_at, node.id AS cursor_id, {projection}
+    ORDER BY created_at DESC, cursor_id DESC
+    LIMIT $limit
+    """
+    async with get_session() as session:
         try:
-            result = session.run(query, user_id=user_id)
-            followers = []
-            for record in result:
-
-                follower_node = record.get("follower")
-                if follower_node is not None:
-                    followers.append(follower_node._properties)
-            return followers
+            result = await session.run(query, key=key, after_created_at=after_created_at,
+                                       after_id=after_id, limit=limit)
+            records = [record async for record in result]
         except Exception as e:
             raise Exception(f"Neo4j query error: {str(e)}")
+    items = [{field: record[field] for field in fields} for record in records]
+    next_cursor = None
+    if len(records) == limit:
+        next_cursor = encode_cursor(records[-1]["created_at"], records[-1]["cursor_id"])
+    return items, next_cursor
 
+async def get_followers(user_id: str, fields=USER_FIELDS, cursor: Optional[str] = None, limit: int = EDGE_PAGE_SIZE):
+    return await get_edge_page("followers", user_id, fields, cursor, limit)
 
+async def get_following(user_id: str, fields=USER_FIELDS, cursor: Optional[str] = None, limit: int = EDGE_PAGE_SIZE):
+    return await get_edge_page("following", user_id, fields, cursor, limit)
 
-def get_following(user_id: str):
-    with get_session() as session:
-        query = """
-        MATCH (user:User {id: $user_id})-[:FOLLOW]->(followee:User)
-        RETURN followee
-        """
-        try:
-            result = session.run(query, user_id=user_id)
-            following = []
-            for record in result:
-                followee_node = record.get("followee")
-                if followee_node is not None:
-                    following.append(followee_node._properties)
-            return following
-        except Exception as e:
-            raise Exception(f"Neo4j query error: {str(e)}")
+async def get_likes(post_id: str, fields=USER_FIELDS, cursor: Optional[str] = None, limit: int = EDGE_PAGE_SIZE):
+    return await get_edge_page("likes", post_id, fields, cursor, limit)
 
-def get_likes(post_id: str):
-    with get_session() as session:
+async def check_follow(follower_id: str, followee_id: str):
+    async with get_session() as session:
         query = """
-        MATCH (user:User)-[:LIKE]->(post:Post {id: $post_id})
-        RETURN user
+        MATCH (a:User {id: $follower_id}), (b:User {id: $followee_id})
+        RETURN EXISTS { (a)-[:FOLLOW]->(b) } AS follows, EXISTS { (b)-[:FOLLOW]->(a) } AS followed_by
         """
-        try:
-            result = session.run(query, post_id=post_id)
-            users_liked = []
-            for record in result:
-                user_node = record.get("user")
-                if user_node is not None:
-                    users_liked.append(user_node._properties)
-            return users_liked
-        except Exception as e:
-            raise Exception(f"Neo4j query error: {str(e)}")
+        result = await session.run(query, follower_id=follower_id, followee_id=followee_id)
+        record = await result.single()
+        return None if record is None else record.data()
 
 
 @app.post("/users", response_model=UserResponse)
 async def create_user_route(user: CreateUserRequest):
     try:
-        created_user = create_user(user.id, user.name)
+        created_user = await create_user(user.id, user.name)
         return UserResponse(id=user.id, name=user.name)
+    except ConstraintError:
+        raise HTTPException(status_code=409, detail="User already exists")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating user: {str(e)}")
 
 
 @app.post("/posts", response_model=PostResponse)
 async def create_post_route(post: CreatePostRequest):
+    post.timestamp = as_utc(post.timestamp)
     try:
-        created_post = create_post(post.id, post.content, post.timestamp)
+        if post.author_id is None:
+            created_post = await create_post(post.id, post.content, post.timestamp)
+        else:
+            created_post = await create_authored_post(post.id, post.content, post.timestamp, post.author_id)
+            if created_post is None:
+                raise HTTPException(status_code=404, detail="Author not found")
+            fan_out(post, created_post["follower_count"], created_post["follower_ids"])
         return PostResponse(id=post.id, content=post.content, timestamp=post.timestamp)
+    except HTTPException:
+        raise
+    except ConstraintError:
+        raise HTTPException(status_code=409, detail="Post already exists")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating post: {str(e)}")
 
 
+@app.get("/posts", response_model=PostPage)
+async def list_posts_route(since: Optional[datetime] = None, until: Optional[datetime] = None,
+                           cursor: Optional[str] = None, limit: int = Query(POST_PAGE_SIZE, ge=1, le=1000)):
+    """
+    Posts in [since, until), oldest first. Pass `next_cursor` back as `cursor` for the next page.
+    """
+    after = decode_time_cursor(cursor) if cursor is not None else None
+    try:
+        items, next_cursor = await list_posts(since, until, after, limit)
+        return {"items": items, "next_cursor": next_cursor}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error listing posts: {str(e)}")
+
+
+@app.post("/posts/migrate-timestamps")
+async def migrate_timestamps_route(batch_size: int = Query(TIMESTAMP_MIGRATION_BATCH_SIZE, ge=1, le=50000)):
+    """
+    One-off conversion of posts written with string timestamps.
+    """
+    try:
+        return await migrate_timestamps(batch_size)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error migrating timestamps: {str(e)}")
+
+
+@app.post("/import/{kind}")
+async def import_route(kind: str, request: Request,
+                       batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=50000),
+                       workers: int = Query(DEFAULT_WORKERS, ge=1, le=32)):
+    """
+    Bulk import users, posts, follows or likes from the raw request body: CSV with a
+    header row (Content-Type: text/csv) or NDJSON. The body is parsed as it streams in.
+    """
+    if kind not in FIELDS:
+        raise HTTPException(status_code=404, detail=f"Unknown import kind '{kind}'")
+    fmt = "csv" if request.headers.get("content-type", "").startswith("text/csv") else "ndjson"
+    stats = ImportStats(kind)
+    rows = iter_rows(iter_lines(request.stream()), fmt, kind, stats)
+    await import_rows(driver, kind, rows, batch_size, workers, stats)
+    # Imported posts and follows are not fanned out, so loaded timelines are rebuilt on next read.
+    if kind == "posts":
+        authored.clear()
+    if kind in ("posts", "follows"):
+        timelines.clear()
+    # Imported follows stale cached recommendations, which follow_user drops per follower.
+    if kind == "follows":
+        recommendation_cache.clear()
+    return stats.as_dict()
+
+
 @app.post("/users/{follower_id}/follow/{followee_id}", response_model=FollowResponse)
-async def follow_user(follower_id: str, followee_id: str):
+async def follow_user(follower_id: str, followee_id: str, response: Response):
     try:
-        create_follow(follower_id, followee_id)
+        if WRITE_BEHIND:
+            # Caches are invalidated by on_written, once the flusher has created the edge.
+            await write_behind.submit("follows", {"follower_id": follower_id, "followee_id": followee_id})
+            response.status_code = 202
+            return {"message": "Follow relationship queued"}
+        await create_follow(follower_id, followee_id)
+        timelines.discard(follower_id)
+        recommendation_cache.delete(follower_id)
         return {"message": "Follow relationship created"}
+    except WriteBehindFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating follow relationship: {str(e)}")
 
 
 @app.post("/users/{user_id}/like/{post_id}", response_model=FollowResponse)
-async def like_post(user_id: str, post_id: str):
+async def like_post(user_id: str, post_id: str, response: Response):
     try:
-        create_like(user_id, post_id)
+        if WRITE_BEHIND:
+            # Counted towards trending by on_written, once the flusher has created the edge.
+            await write_behind.submit("likes", {"user_id": user_id, "post_id": post_id})
+            response.status_code = 202
+            return {"message": "Like relationship queued"}
+        if await create_like(user_id, post_id):
+            trending.add(post_id)
         return {"message": "Like relationship created"}
+    except WriteBehindFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating like relationship: {str(e)}")
 
 
-@app.get("/users/{user_id}/followers", response_model=List[UserResponse])
-async def get_user_followers(user_id: str):
+class Recommendation(BaseModel):
+    id: str
+    name: Optional[str] = None
+    mutual: int
+
+class TrendingPost(BaseModel):
+    id: str
+    likes: int
+
+class TrendingPage(BaseModel):
+    window: str
+    items: List[TrendingPost]
+
+
+async def rebuild_trending():
+    """
+    Reload the trending counts from the LIKE edges created within the largest window.
+    """
+    bucket_ms = TRENDING_BUCKET_SECONDS * 1000
+    since = int((time.time() - max(TRENDING_WINDOWS.values())) * 1000)
+    query = """
+    MATCH (:User)-[r:LIKE]->(p:Post)
+    WHERE r.created_at >= $since
+    RETURN p.id AS post_id, r.created_at / $bucket_ms AS bucket, count(*) AS likes
+    """
+    trending.clear()
+    async with get_session() as session:
+        result = await session.run(query, since=since, bucket_ms=bucket_ms)
+        async for record in result:
+            trending.add(record["post_id"], record["bucket"] * TRENDING_BUCKET_SECONDS, record["likes"])
+
+
+async def compute_recommendations(user_id: str):
+    """
+    Up to RECOMMENDATION_MAX_K users followed by the people `user_id` follows, but not
+    by `user_id`, ranked by how many of those people follow them. None if the
+    user does not exist.
+    """
+    query = """
+    MATCH (me:User {id: $user_id})
+    CALL {
+        WITH me
+        WITH me, CASE WHEN coalesce(me.following_count, 0) <= $max_friends THEN 1.0
+                      ELSE toFloat($max_friends) / me.following_count END AS keep
+        MATCH (me)-[:FOLLOW]->(friend:User)
+        WHERE rand() < keep
+        WITH me, friend LIMIT $max_friends
+        CALL {
+            WITH friend
+            MATCH (friend)-[:FOLLOW]->(candidate:User)
+            RETURN candidate LIMIT $max_fanout
+        }
+        WITH me, candidate, count(*) AS mutual
+        WHERE candidate <> me AND NOT EXISTS { (me)-[:FOLLOW]->(candidate) }
+        WITH candidate, mutual ORDER BY mutual DESC, candidate.id LIMIT $k
+        RETURN collect({id: candidate.id, name: candidate.name, mutual: mutual}) AS recommendations
+    }
+    RETURN recommendations
+    """
+    async with get_session() as session:
+        result = await session.run(query, user_id=user_id, max_friends=RECOMMENDATION_MAX_FRIENDS,
+                                   max_fanout=RECOMMENDATION_MAX_FANOUT, k=RECOMMENDATION_MAX_K)
+        record = await result.single()
+        return None if record is None else record["recommendations"]
+
+async def get_recommendations(user_id: str):
+    recommendations = recommendation_cache.get(user_id)
+    if recommendations is MISSING:
+        recommendations = await compute_recommendations(user_id)
+        if recommendations is not None:
+            recommendation_cache.set(user_id, recommendations)
+    return recommendations
+
+async def get_active_user_ids(hours: float, limit: int):
+    since = int((time.time() - hours * 3600) * 1000)
+    query = """
+    CALL {
+        MATCH (u:User)-[r:FOLLOW]->() WHERE r.created_at >= $since RETURN u
+        UNION
+        MATCH (u:User)-[r:LIKE]->() WHERE r.created_at >= $since RETURN u
+    }
+    RETURN u.id AS id
+    LIMIT $limit
+    """
+    async with get_session() as session:
+        result = await session.run(query, since=since, limit=limit)
+        return [record["id"] async for record in result]
+
+async def precompute_recommendations(hours: float = RECOMMENDATION_ACTIVE_HOURS,
+                                     limit: int = RECOMMENDATION_PRECOMPUTE_LIMIT):
+    """
+    Refresh the cached recommendations of users who followed or liked anything in
+    the last `hours`, so their reads are cache hits.
+    """
+    user_ids = await get_active_user_ids(hours, limit)
+    semaphore = asyncio.Semaphore(RECOMMENDATION_PRECOMPUTE_CONCURRENCY)
+
+    async def refresh(user_id):
+        async with semaphore:
+            recommendations = await compute_recommendations(user_id)
+            if recommendations is not None:
+                recommendation_cache.set(user_id, recommendations)
+
+    await asyncio.gather(*(refresh(user_id) for user_id in user_ids))
+    return {"users": len(user_ids)}
+
+async def precompute_periodically():
+    while True:
+        try:
+            await precompute_recommendations()
+        except Exception:
+            logger.exception("Recommendation precompute failed")
+        await asyncio.sleep(RECOMMENDATION_PRECOMPUTE_INTERVAL)
+
+
+@app.get("/users/{user_id}/recommendations", response_model=List[Recommendation])
+async def get_user_recommendations(user_id: str, k: int = Query(10, ge=1, le=RECOMMENDATION_MAX_K)):
+    """
+    Who to follow: friends of friends ranked by mutual follows, cached per user.
+    """
+    try:
+        recommendations = await get_recommendations(user_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching recommendations: {str(e)}")
+    if recommendations is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return recommendations[:k]
+
+
+@app.post("/recommendations/precompute")
+async def precompute_recommendations_route(hours: float = Query(RECOMMENDATION_ACTIVE_HOURS, gt=0),
+                                           limit: int = Query(RECOMMENDATION_PRECOMPUTE_LIMIT, ge=1, le=1000000)):
     try:
-        followers = get_followers(user_id)
-        if not followers:
+        return await precompute_recommendations(hours, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error precomputing recommendations: {str(e)}")
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {"recommendations": recommendation_cache.stats()}
+
+
+@app.get("/posts/trending", response_model=TrendingPage)
+async def get_trending_posts(window: str = "1h", k: int = Query(50, ge=1, le=TRENDING_MAX_K)):
+    """
+    The `k` most-liked posts over the last `window` (5m, 1h or 24h), from memory.
+    """
+    if window not in TRENDING_WINDOWS:
+        raise HTTPException(status_code=400, detail=f"window must be one of {', '.join(TRENDING_WINDOWS)}")
+    items = [{"id": post_id, "likes": likes} for post_id, likes in trending.trending(window, k)]
+    return {"window": window, "items": items}
+
+
+@app.get("/metrics/write-behind")
+async def write_behind_metrics():
+    """
+    Queue depth, throughput and flush latency of the write-behind queue.
+    """
+    return dict(write_behind.stats(), enabled=WRITE_BEHIND)
+
+
+async def get_user_counts(user_id: str):
+    async with get_session() as session:
+        query = """
+        MATCH (u:User {id: $user_id})
+        RETURN u.id AS id, coalesce(u.follower_count, 0) AS followers, coalesce(u.following_count, 0) AS following
+        """
+        result = await session.run(query, user_id=user_id)
+        record = await result.single()
+        return None if record is None else record.data()
+
+async def get_post_counts(post_id: str):
+    async with get_session() as session:
+        query = """
+        MATCH (p:Post {id: $post_id})
+        RETURN p.id AS id, coalesce(p.like_count, 0) AS likes
+        """
+        result = await session.run(query, post_id=post_id)
+        record = await result.single()
+        return None if record is None else record.data()
+
+# Each statement recounts one batch of nodes from their edges, keyed on id so the
+# scan can resume where the previous batch stopped. Only drifted nodes are written,
+# so the periodic job does not lock hot nodes that live MERGEs are updating.
+RECONCILE_QUERIES = {
+    "users": """
+        MATCH (n:User) WHERE n.id > $after
+        WITH n ORDER BY n.id LIMIT $batch_size
+        WITH n, COUNT { (:User)-[:FOLLOW]->(n) } AS followers, COUNT { (n)-[:FOLLOW]->(:User) } AS following
+        WITH n, followers, following,
+             coalesce(n.follower_count, 0) <> followers OR coalesce(n.following_count, 0) <> following AS drifted
+        FOREACH (_ IN CASE WHEN drifted THEN [1] ELSE [] END |
+            SET n.follower_count = followers, n.following_count = following)
+        RETURN max(n.id) AS last_id, count(n) AS scanned, sum(CASE WHEN drifted THEN 1 ELSE 0 END) AS repaired
+    """,
+    "posts": """
+        MATCH (n:Post) WHERE n.id > $after
+        WITH n ORDER BY n.id LIMIT $batch_size
+        WITH n, COUNT { (:User)-[:LIKE]->(n) } AS likes
+        WITH n, likes, coalesce(n.like_count, 0) <> likes AS drifted
+        FOREACH (_ IN CASE WHEN drifted THEN [1] ELSE [] END | SET n.like_count = likes)
+        RETURN max(n.id) AS last_id, count(n) AS scanned, sum(CASE WHEN drifted THEN 1 ELSE 0 END) AS repaired
+    """,
+}
+RECONCILE_BATCH_SIZE = int(os.environ.get("RECONCILE_BATCH_SIZE", "5000"))
+RECONCILE_INTERVAL = float(os.environ.get("RECONCILE_INTERVAL", "0"))  # seconds; 0 disables the periodic job
+
+async def reconcile_batch(tx, query, after, batch_size):
+    result = await tx.run(query, after=after, batch_size=batch_size)
+    return (await result.single()).data()
+
+# Same batching as the reconcile: collapse parallel FOLLOW/LIKE edges left behind
+# by the CREATE-based writes, keeping one edge per pair.
+DEDUPE_QUERIES = {
+    "follows": """
+        MATCH (n:User) WHERE n.id > $after
+        WITH n ORDER BY n.id LIMIT $batch_size
+        OPTIONAL MATCH (n)-[r:FOLLOW]->(other:User)
+        WITH n, other, collect(r) AS rels
+        FOREACH (duplicate IN tail(rels) | DELETE duplicate)
+        WITH n, sum(CASE WHEN size(rels) > 1 THEN size(rels) - 1 ELSE 0 END) AS removed
+        RETURN max(n.id) AS last_id, count(n) AS scanned, sum(removed) AS repaired
+    """,
+    "likes": """
+        MATCH (n:User) WHERE n.id > $after
+        WITH n ORDER BY n.id LIMIT $batch_size
+        OPTIONAL MATCH (n)-[r:LIKE]->(other:Post)
+        WITH n, other, collect(r) AS rels
+        FOREACH (duplicate IN tail(rels) | DELETE duplicate)
+        WITH n, sum(CASE WHEN size(rels) > 1 THEN size(rels) - 1 ELSE 0 END) AS removed
+        RETURN max(n.id) AS last_id, count(n) AS scanned, sum(removed) AS repaired
+    """,
+}
+
+async def run_batched(queries, batch_size: int):
+    """
+    Run each keyset-batched maintenance query over all its nodes, one write
+    transaction per batch, and total what it scanned and repaired.
+    """
+    report = {}
+    async with get_session() as session:
+        for kind, query in queries.items():
+            scanned = repaired = 0
+            after = ""
+            while True:
+                batch = await session.execute_write(reconcile_batch, query, after, batch_size)
+                if not batch["scanned"]:
+                    break
+                scanned += batch["scanned"]
+                repaired += batch["repaired"]
+                after = batch["last_id"]
+            report[kind] = {"scanned": scanned, "repaired": repaired}
+    return report
+
+async def reconcile_counts(batch_size: int = RECONCILE_BATCH_SIZE):
+    """
+    Recount followers, following and likes from the edges and report how many
+    stored counters had drifted.
+    """
+    return await run_batched(RECONCILE_QUERIES, batch_size)
+
+async def dedupe_edges(batch_size: int = RECONCILE_BATCH_SIZE):
+    """
+    Remove duplicate FOLLOW/LIKE edges; `repaired` is the number of edges deleted.
+    """
+    return await run_batched(DEDUPE_QUERIES, batch_size)
+
+async def reconcile_periodically():
+    while True:
+        await asyncio.sleep(RECONCILE_INTERVAL)
+        try:
+            await reconcile_counts()
+        except Exception:
+            logger.exception("Counter reconcile failed")
+
+async def list_posts(since: Optional[datetime], until: Optional[datetime], after, limit: int):
+    """
+    Posts with since <= timestamp < until, oldest first, keyset-paginated on
+    (timestamp, id) from `after`. Returns (items, next_cursor).
+    """
+    since = as_utc(since) if since is not None else None
+    until = as_utc(until) if until is not None else None
+    # Unmigrated string timestamps sort after every datetime in Cypher, which would
+    # break the (timestamp, id) keyset; they are listed once migrate-timestamps ran.
+    conditions = ["p.timestamp IS :: ZONED DATETIME NOT NULL"]
+    params = {"limit": limit}
+    lower = since
+    if after is not None:
+        # Both bounds stay plain range predicates on p.timestamp so the index can seek;
+        # within the cursor's own timestamp, the id breaks the tie.
+        lower = after[0] if since is None else max(since, after[0])
+        conditions.append("(p.timestamp > $after_timestamp OR p.id > $after_id)")
+        params.update(after_timestamp=after[0], after_id=after[1])
+    if lower is not None:
+        conditions.append("p.timestamp >= $since")
+        params["since"] = lower
+    if until is not None:
+        conditions.append("p.timestamp < $until")
+        params["until"] = until
+    query = f"""
+    MATCH (p:Post)
+    WHERE {" AND ".join(conditions)}
+    RETURN p.id AS id, p.content AS content, p.timestamp AS timestamp
+    ORDER BY p.timestamp, p.id
+    LIMIT $limit
+    """
+    async with get_session() as session:
+        result = await session.run(query, **params)
+        items = [dict(record.data(), timestamp=as_datetime(record["timestamp"])) async for record in result]
+    next_cursor = None
+    if len(items) == limit:
+        next_cursor = encode_cursor(items[-1]["timestamp"].isoformat(), items[-1]["id"])
+    return items, next_cursor
+
+async def read_string_timestamps(tx, batch_size: int):
+    query = """
+    MATCH (p:Post) WHERE p.timestamp IS :: STRING
+    RETURN p.id AS id, p.timestamp AS timestamp
+    LIMIT $batch_size
+    """
+    result = await tx.run(query, batch_size=batch_size)
+    return [record.data() async for record in result]
+
+async def write_timestamps(tx, rows, unparsed_ids):
+    await tx.run("""
+    UNWIND $rows AS row
+    MATCH (p:Post {id: row.id})
+    SET p.timestamp = row.timestamp
+    """, rows=rows)
+    # Kept aside rather than dropped, so a bad value can be fixed by hand later.
+    await tx.run("""
+    UNWIND $post_ids AS post_id
+    MATCH (p:Post {id: post_id})
+    SET p.timestamp_unparsed = p.timestamp
+    REMOVE p.timestamp
+    """, post_ids=unparsed_ids)
+
+async def migrate_timestamps(batch_size: int = TIMESTAMP_MIGRATION_BATCH_SIZE):
+    """
+    Convert string post timestamps to native datetimes, one write transaction per
+    batch. Strings that are not ISO 8601 move to timestamp_unparsed.
+    """
+    converted = unparsed = 0
+    async with get_session() as session:
+        while True:
+            batch = await session.execute_read(read_string_timestamps, batch_size)
+            if not batch:
+                break
+            rows, unparsed_ids = [], []
+            for row in batch:
+                timestamp = as_datetime(row["timestamp"])
+                if timestamp is None:
+                    unparsed_ids.append(row["id"])
+                else:
+                    rows.append({"id": row["id"], "timestamp": timestamp})
+            await session.execute_write(write_timestamps, rows, unparsed_ids)
+            converted += len(rows)
+            unparsed += len(unparsed_ids)
+    return {"converted": converted, "unparsed": unparsed}
+
+async def fetch_entries(query: str, **params):
+    """
+    Timeline entries from `query`, or None if it returned no rows at all.
+    """
+    async with get_session() as session:
+        result = await session.run(query, **params)
+        entries = [(as_datetime(record["timestamp"]), record["id"], record["author_id"]) async for record in result]
+        if not entries:
+            return None
+        return [entry for entry in entries if entry[0] is not None]
+
+async def load_timeline(user_id: str):
+    """
+    Cold start (first read since the process started, or since the user followed
+    someone): rebuild the timeline from the graph; from then on it is kept current
+    by fan-out on write. Returns False, loading nothing, if the user does not exist.
+    """
+    query = """
+    MATCH (u:User {id: $user_id})
+    OPTIONAL MATCH (u)-[:FOLLOW]->(author:User)-[:POSTED]->(p:Post)
+    RETURN p.timestamp AS timestamp, p.id AS id, author.id AS author_id
+    ORDER BY timestamp DESC LIMIT $limit
+    """
+    entries = await fetch_entries(query, user_id=user_id, limit=TIMELINE_MAX_LENGTH)
+    if entries is None:
+        return False
+    timelines.load(user_id, entries)
+    return True
+
+async def load_authored(author_id: str):
+    query = """
+    MATCH (author:User {id: $author_id})-[:POSTED]->(p:Post)
+    RETURN p.timestamp AS timestamp, p.id AS id, author.id AS author_id
+    ORDER BY timestamp DESC LIMIT $limit
+    """
+    authored.load(author_id, await fetch_entries(query, author_id=author_id, limit=TIMELINE_MAX_LENGTH) or [])
+
+def fan_out(post: CreatePostRequest, follower_count: int, follower_ids: List[str]):
+    entry = (post.timestamp, post.id, post.author_id)
+    if authored.contains(post.author_id):
+        authored.add(post.author_id, entry)
+    if follower_count > CELEBRITY_FOLLOWER_THRESHOLD:
+        celebrities.add(post.author_id)
+        return
+    celebrities.discard(post.author_id)
+    # Timelines not loaded yet will pick the post up from the graph on first read.
+    timelines.add_many([user_id for user_id in follower_ids if timelines.contains(user_id)], entry)
+
+async def get_celebrity_followees(user_id: str):
+    if not celebrities:
+        return []
+    async with get_session() as session:
+        query = """
+        MATCH (:User {id: $user_id})-[:FOLLOW]->(c:User)
+        WHERE c.id IN $celebrities
+        RETURN c.id AS id
+        """
+        result = await session.run(query, user_id=user_id, celebrities=list(celebrities))
+        return [record["id"] async for record in result]
+
+async def get_posts(post_ids: List[str]):
+    async with get_session() as session:
+        query = """
+        UNWIND $post_ids AS post_id
+        MATCH (p:Post {id: post_id})
+        RETURN p.id AS id, p.content AS content, p.timestamp AS timestamp
+        """
+        result = await session.run(query, post_ids=post_ids)
+        return {record["id"]: dict(record.data(), timestamp=as_datetime(record["timestamp"]))
+                async for record in result}
+
+async def get_feed(user_id: str, before, limit: int):
+    """
+    One page of the user's feed, or None if the user does not exist.
+    """
+    if not timelines.contains(user_id) and not await load_timeline(user_id):
+        return None
+    entries = timelines.page(user_id, before, limit)
+    for author_id in await get_celebrity_followees(user_id):
+        if not authored.contains(author_id):
+            await load_authored(author_id)
+        entries += authored.page(author_id, before, limit)
+    entries = sorted(set(entries), reverse=True)[:limit]
+    posts = await get_posts([post_id for _, post_id, _ in entries])
+    items = [dict(posts[post_id], author_id=author_id) for _, post_id, author_id in entries if post_id in posts]
+    next_cursor = None
+    if len(entries) == limit:
+        next_cursor = encode_cursor(entries[-1][0].isoformat(), entries[-1][1])
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@app.get("/users/{user_id}/counts", response_model=UserCounts)
+async def get_user_counts_route(user_id: str):
+    try:
+        counts = await get_user_counts(user_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching counts: {str(e)}")
+    if counts is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return counts
+
+
+@app.get("/posts/{post_id}/counts", response_model=PostCounts)
+async def get_post_counts_route(post_id: str):
+    try:
+        counts = await get_post_counts(post_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching counts: {str(e)}")
+    if counts is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return counts
+
+
+@app.post("/counts/reconcile")
+async def reconcile_counts_route(batch_size: int = Query(RECONCILE_BATCH_SIZE, ge=1, le=50000)):
+    """
+    Repair follower/following/like counters that drifted from the edges.
+    """
+    try:
+        return await reconcile_counts(batch_size)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reconciling counts: {str(e)}")
+
+
+@app.post("/edges/dedupe")
+async def dedupe_edges_route(batch_size: int = Query(RECONCILE_BATCH_SIZE, ge=1, le=50000)):
+    """
+    One-off cleanup of duplicate FOLLOW/LIKE edges, followed by a counter reconcile.
+    """
+    try:
+        return {"edges": await dedupe_edges(batch_size), "counts": await reconcile_counts(batch_size)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error removing duplicate edges: {str(e)}")
+
+
+@app.get("/users/{user_id}/feed", response_model=FeedPage)
+async def get_user_feed(user_id: str, cursor: Optional[str] = None, limit: int = Query(20, ge=1, le=100)):
+    """
+    Newest posts from the accounts the user follows. Pass `next_cursor` back as
+    `cursor` for the next page.
+    """
+    before = decode_time_cursor(cursor) if cursor is not None else None
+    try:
+        feed = await get_feed(user_id, before, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching feed: {str(e)}")
+    if feed is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return feed
+
+
+@app.get("/users/{a}/follows/{b}", response_model=FollowCheck)
+async def check_follow_route(a: str, b: str):
+    """
+    Whether `a` follows `b`, `b` follows `a`, and so whether they follow each other.
+    """
+    try:
+        record = await check_follow(a, b)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error checking follow: {str(e)}")
+    if record is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return dict(record, mutual=record["follows"] and record["followed_by"])
+
+
+@app.get("/users/{user_id}/followers", response_model=List[UserProjection], response_model_exclude_unset=True)
+async def get_user_followers(user_id: str, response: Response, cursor: Optional[str] = None,
+                             limit: int = Query(EDGE_PAGE_SIZE, ge=1, le=MAX_EDGE_PAGE_SIZE),
+                             fields: Optional[str] = None, if_none_match: Optional[str] = Header(None)):
+    fields = parse_fields(fields)
+    try:
+        followers, next_cursor = await get_followers(user_id, fields, cursor, limit)
+        if not followers and cursor is None:
             raise HTTPException(status_code=404, detail="No followers found for this user")
-        return followers
+        return user_list_response(followers, next_cursor, response, if_none_match)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching followers: {str(e)}")
 
 
-@app.get("/users/{user_id}/following", response_model=List[UserResponse])
-async def get_user_following(user_id: str):
+@app.get("/users/{user_id}/following", response_model=List[UserProjection], response_model_exclude_unset=True)
+async def get_user_following(user_id: str, response: Response, cursor: Optional[str] = None,
+                             limit: int = Query(EDGE_PAGE_SIZE, ge=1, le=MAX_EDGE_PAGE_SIZE),
+                             fields: Optional[str] = None, if_none_match: Optional[str] = Header(None)):
+    fields = parse_fields(fields)
     try:
-        following = get_following(user_id)
-        if not following:
+        following, next_cursor = await get_following(user_id, fields, cursor, limit)
+        if not following and cursor is None:
             raise HTTPException(status_code=404, detail="This user is not following anyone")
-        return following
+        return user_list_response(following, next_cursor, response, if_none_match)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching following: {str(e)}")
 
 
-@app.get("/posts/{post_id}/likes", response_model=List[UserResponse])
-async def get_post_likes(post_id: str):
+@app.get("/posts/{post_id}/likes", response_model=List[UserProjection], response_model_exclude_unset=True)
+async def get_post_likes(post_id: str, response: Response, cursor: Optional[str] = None,
+                         limit: int = Query(EDGE_PAGE_SIZE, ge=1, le=MAX_EDGE_PAGE_SIZE),
+                         fields: Optional[str] = None, if_none_match: Optional[str] = Header(None)):
+    fields = parse_fields(fields)
     try:
-        users_liked = get_likes(post_id)
-        if not users_liked:
+        users_liked, next_cursor = await get_likes(post_id, fields, cursor, limit)
+        if not users_liked and cursor is None:
             raise HTTPException(status_code=404, detail="No users liked this post")
-        return users_liked
+        return user_list_response(users_liked, next_cursor, response, if_none_match)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching likes: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error fetching likes: {str(e)}")
+
+
+@app.on_event("startup")
+async def startup_event():
+    try:
+        await ensure_schema()
+    except Exception:
+        # Neo4j unreachable, or existing User/Post nodes sharing an id; merge or remove those, then restart.
+        logger.exception("Schema bootstrap failed")
+    try:
+        await rebuild_trending()
+    except Exception:
+        logger.exception("Trending rebuild failed; counting from new likes only")
+    if RECONCILE_INTERVAL > 0:
+        app.state.reconcile_task = asyncio.create_task(reconcile_periodically())
+    if RECOMMENDATION_PRECOMPUTE_INTERVAL > 0:
+        app.state.precompute_task = asyncio.create_task(precompute_periodically())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for name in ("reconcile_task", "precompute_task"):
+        task = getattr(app.state, name, None)
+        if task is not None:
+            task.cancel()
+    # Write out everything acknowledged but not yet flushed before the driver goes.
+    await write_behind.close()
+    await driver.close()
@@ -0,0 +1,62 @@
+"""
+Compare GET /users/ in main.py with and without FAST_JSON_RESPONSES at 10, 1k and 100k rows.
+Runs in-process against a throwaway SQLite database:
+
+    python benchmarks/bench_serialization.py
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import fastjson  # noqa: E402
+import main  # noqa: E402
+
+SIZES = [(10, 500), (1000, 50), (100000, 3)]  # (rows, repetitions)
+
+
+def seed(rows):
+    with main.engine.begin() as connection:
+        connection.execute(
+            main.User.__table__.insert(),
+            [
+                {"name": f"user{i}", "email": f"user{i}@example.com", "age": 18 + i % 60,
+                 "gender": "female" if i % 2 else "male"}
+                for i in range(rows)
+            ],
+        )
+
+
+def median_seconds(client, rows, repetitions):
+    timings = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        response = client.get("/users/", params={"limit": rows})
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200
+    return statistics.median(timings), response.json()
+
+
+def main_():
+    seed(max(rows for rows, _ in SIZES))
+    client = TestClient(main.app)
+    encoder = "orjson" if fastjson.orjson is not None else "json"
+    print(f"{'rows':>8} {'default ms':>12} {'fast ms':>10} {'speedup':>8}   (encoder: {encoder})")
+    for rows, repetitions in SIZES:
+        fastjson.FAST_JSON_RESPONSES = False
+        default, expected = median_seconds(client, rows, repetitions)
+        fastjson.FAST_JSON_RESPONSES = True
+        fast, actual = median_seconds(client, rows, repetitions)
+        assert actual == expected, "fast path changed the response body"
+        print(f"{rows:>8} {default * 1000:>12.2f} {fast * 1000:>10.2f} {default / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main_()
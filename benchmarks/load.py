@@ -0,0 +1,311 @@
+"""
+Load and latency benchmark for the four FastAPI apps, driven in-process over ASGI.
+
+main.py runs against a throwaway SQLite database; relation.py, app.py and
+CheckIN_OUT.py run against the in-memory neo4j stand-in, so nothing needs a
+server or network:
+
+    python benchmarks/load.py --app all --concurrency 32 --requests 2000
+    python benchmarks/load.py --app social --read-ratio 0.5 --output social.json
+    python benchmarks/load.py --app all --compare baseline.json
+
+Each run reports throughput and p50/p95/p99 latency, overall and per operation,
+as JSON. --compare prints the ratio against a previous report for regressions.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx  # noqa: E402
+
+import neo4j_standin  # noqa: E402
+
+APPS = ("main", "relation", "social", "checkin")
+GENDERS = ("female", "male", "other")
+ROLES = ("admin", "staff", "staff", "visitor", "visitor", "visitor")
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile; sorted_values must be non-empty.
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies):
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values) * 1000, 3),
+        "p50": round(percentile(values, 0.50) * 1000, 3),
+        "p95": round(percentile(values, 0.95) * 1000, 3),
+        "p99": round(percentile(values, 0.99) * 1000, 3),
+        "max": round(values[-1] * 1000, 3),
+    }
+
+
+# -- scenarios -----------------------------------------------------------------
+#
+# A scenario seeds its dataset, then hands out (operation, method, path, body)
+# tuples. `read` decides which half of the mix the next request comes from.
+
+
+class MainScenario:
+    name = "main"
+
+    def __init__(self, rng, seed_size, graph):
+        os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+        import main
+        self.app = main.app
+        self.rng = rng
+        self.next_id = seed_size
+        with main.engine.begin() as connection:
+            connection.execute(main.User.__table__.insert(), [self.user(i) for i in range(seed_size)])
+        with main.engine.connect() as connection:
+            self.max_id = connection.exec_driver_sql("SELECT max(id) FROM users").scalar() or 1
+
+    def user(self, i):
+        return {"name": f"user{i}", "email": f"user{i}@example.com", "age": 18 + i % 60,
+                "gender": GENDERS[i % len(GENDERS)]}
+
+    def next_request(self, read):
+        rng = self.rng
+        if read:
+            choice = rng.random()
+            if choice < 0.6:
+                return "read_user", "GET", f"/users/{rng.randint(1, self.max_id)}", None
+            if choice < 0.8:
+                return "read_users", "GET", f"/users/?skip={rng.randint(0, self.max_id)}&limit=20", None
+            return "search", "GET", f"/users/search?gender={rng.choice(GENDERS)}&min_age=20&max_age=40", None
+        if rng.random() < 0.5:
+            self.next_id += 1
+            return "create_user", "POST", "/users/", self.user(self.next_id)
+        return "update_user", "PUT", f"/users/{rng.randint(1, self.max_id)}", {"age": rng.randint(18, 80)}
+
+
+class RelationScenario:
+    name = "relation"
+
+    def __init__(self, rng, seed_size, graph):
+        import relation
+        relation.driver = graph.async_driver()
+        self.app = relation.app
+        self.rng = rng
+        self.user_ids = [graph.add_node("User", name=f"user{i}", email=f"user{i}@example.com",
+                                        age=18 + i % 60, gender=GENDERS[i % 3]).id
+                         for i in range(seed_size)]
+
+    def next_request(self, read):
+        rng = self.rng
+        if read:
+            if rng.random() < 0.9:
+                return "read_user", "GET", f"/users/{rng.choice(self.user_ids)}", None
+            return "read_all_users", "GET", "/users/", None
+        choice = rng.random()
+        if choice < 0.3:
+            i = rng.randint(0, 10 ** 9)
+            return "create_user", "POST", "/users/", {"name": f"user{i}", "email": f"user{i}@example.com",
+                                                      "age": 30, "gender": "other"}
+        if choice < 0.8:
+            return "create_relationship", "POST", "/relationships/", {
+                "source_id": rng.choice(self.user_ids), "target_id": rng.choice(self.user_ids),
+                "relationship_type": "FRIEND"}
+        return "update_user", "PUT", f"/users/{rng.choice(self.user_ids)}", {"age": rng.randint(18, 80)}
+
+
+class SocialScenario:
+    name = "social"
+
+    def __init__(self, rng, seed_size, graph):
+        import app
+        app.driver = graph.async_driver()
+        self.module = app
+        self.app = app.app
+        self.rng = rng
+        self.user_ids = [f"u{i}" for i in range(seed_size)]
+        self.post_ids = [f"p{i}" for i in range(seed_size)]
+        users = [graph.add_node("User", id=user_id, name=f"user {user_id}") for user_id in self.user_ids]
+        posts = [graph.add_node("Post", id=post_id, content="hello", timestamp=datetime(2024, 1, 1, tzinfo=timezone.utc))
+                 for post_id in self.post_ids]
+        # Skewed popularity: low ids collect most follows and likes.
+        for user in users:
+            for _ in range(10):
+                graph.add_edge("FOLLOW", user, users[self.popular(seed_size)])
+                graph.add_edge("LIKE", user, posts[self.popular(seed_size)])
+        self.next_post = seed_size
+
+    async def close(self):
+        # Timed inside the run, so write-behind is measured including its final flush.
+        await self.module.write_behind.close()
+
+    def popular(self, n):
+        return min(n - 1, int(self.rng.paretovariate(1.2)) - 1)
+
+    def next_request(self, read):
+        rng = self.rng
+        user_id = rng.choice(self.user_ids)
+        if read:
+            choice = rng.random()
+            if choice < 0.4:
+                return "followers", "GET", f"/users/{self.user_ids[self.popular(len(self.user_ids))]}/followers", None
+            if choice < 0.7:
+                return "following", "GET", f"/users/{user_id}/following", None
+            return "likes", "GET", f"/posts/{self.post_ids[self.popular(len(self.post_ids))]}/likes", None
+        choice = rng.random()
+        if choice < 0.4:
+            return "like", "POST", f"/users/{user_id}/like/{rng.choice(self.post_ids)}", None
+        if choice < 0.8:
+            return "follow", "POST", f"/users/{user_id}/follow/{rng.choice(self.user_ids)}", None
+        self.next_post += 1
+        return "create_post", "POST", "/posts", {"id": f"p{self.next_post}", "content": "hi",
+                                                 "timestamp": "2024-01-01T00:00:00"}
+
+
+class CheckInScenario:
+    name = "checkin"
+
+    def __init__(self, rng, seed_size, graph):
+        import CheckIN_OUT
+        CheckIN_OUT.db.driver = graph.driver()
+        self.app = CheckIN_OUT.app
+        self.rng = rng
+        self.org_ids = list(range(max(1, seed_size // 100)))
+        self.person_ids = list(range(seed_size))
+        for org_id in self.org_ids:
+            # Open all day so check-ins succeed whenever the benchmark runs.
+            graph.add_node("Organization", id=org_id, opening_time="00:00", closing_time="23:59")
+        for person_id in self.person_ids:
+            graph.add_node("Person", id=person_id, name=f"person{person_id}", role=ROLES[person_id % len(ROLES)])
+
+    def next_request(self, read):
+        rng = self.rng
+        org_id = rng.choice(self.org_ids)
+        if read:
+            return "active_users", "GET", f"/organization/active-users?org_id={org_id}", None
+        if rng.random() < 0.95:
+            return "checkin", "POST", "/organization/checkin", {"user_id": rng.choice(self.person_ids),
+                                                                "org_id": org_id}
+        return "set_times", "POST", "/organization/set-times", {"org_id": org_id, "opening_time": "00:00",
+                                                                "closing_time": "23:59"}
+
+
+SCENARIOS = {
+    "main": MainScenario,
+    "relation": RelationScenario,
+    "social": SocialScenario,
+    "checkin": CheckInScenario,
+}
+
+
+# -- driver ----------------------------------------------------------------------
+
+
+async def run(scenario, requests, concurrency, read_ratio, rng):
+    latencies = {}
+    errors = {}
+    remaining = iter(range(requests))
+    # Unhandled exceptions in a route count as 500s instead of aborting the run.
+    transport = httpx.ASGITransport(app=scenario.app, raise_app_exceptions=False)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            for _ in remaining:
+                operation, method, path, body = scenario.next_request(rng.random() < read_ratio)
+                start = time.perf_counter()
+                response = await client.request(method, path, json=body)
+                latencies.setdefault(operation, []).append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    errors[operation] = errors.get(operation, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        if hasattr(scenario, "close"):
+            await scenario.close()
+        duration = time.perf_counter() - start
+
+    everything = [latency for values in latencies.values() for latency in values]
+    return {
+        "app": scenario.name,
+        "requests": len(everything),
+        "errors": sum(errors.values()),
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(everything) / duration, 1),
+        "latency_ms": summarize(everything),
+        "operations": {
+            operation: dict(summarize(values), errors=errors.get(operation, 0))
+            for operation, values in sorted(latencies.items())
+        },
+    }
+
+
+def compare(report, baseline):
+    """
+    Print throughput and p99 ratios against a previous report (>1.0 p99 means slower).
+    """
+    previous = {result["app"]: result for result in baseline["results"]}
+    for result in report["results"]:
+        before = previous.get(result["app"])
+        if before is None:
+            continue
+        throughput = result["throughput_rps"] / before["throughput_rps"]
+        p99 = result["latency_ms"]["p99"] / before["latency_ms"]["p99"]
+        print(f"{result['app']:>10}: throughput x{throughput:.2f}, p99 x{p99:.2f}", file=sys.stderr)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--app", choices=APPS + ("all",), default="all")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per app")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent in-flight requests")
+    parser.add_argument("--read-ratio", type=float, default=0.8, help="fraction of requests that are reads")
+    parser.add_argument("--seed-size", type=int, default=1000, help="users/nodes to seed per app")
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="simulated neo4j round trip")
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--write-behind", action="store_true", help="queue social follows/likes (WRITE_BEHIND=1)")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="previous JSON report to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.write_behind:
+        os.environ["WRITE_BEHIND"] = "1"
+    rng = random.Random(args.random_seed)
+    results = []
+    for name in (APPS if args.app == "all" else (args.app,)):
+        graph = neo4j_standin.Graph(latency=args.latency_ms / 1000)
+        scenario = SCENARIOS[name](rng, args.seed_size, graph)
+        result = asyncio.run(run(scenario, args.requests, args.concurrency, args.read_ratio, rng))
+        if graph.unhandled:
+            # Routes turned these into 500s; they are the stand-in missing a query shape, not the app.
+            result["unhandled_queries"] = graph.unhandled
+            print(f"{name}: {sum(graph.unhandled.values())} queries had no stand-in handler", file=sys.stderr)
+        results.append(result)
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
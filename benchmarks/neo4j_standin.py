@@ -0,0 +1,798 @@
+"""
+In-memory stand-in for the neo4j driver, so the graph apps can be benchmarked
+offline and in CI. It understands only the query shapes relation.py, app.py and
+CheckIN_OUT.py actually send (matched by fragments of the normalized query).
+Anything else raises UnhandledQuery and is tallied in `Graph.unhandled`, so a
+query whose shape changed shows up as errors in the load report instead of as
+work that was never done. Every query sleeps for `latency`
+seconds to model the database round trip: the sync driver blocks exactly as a
+real one would, the async driver awaits.
+"""
+import asyncio
+import itertools
+import re
+import time
+from datetime import datetime, timezone
+
+
+class UnhandledQuery(Exception):
+    """No handler matches the query; add one to register_handlers."""
+
+
+def normalize(query):
+    return re.sub(r"\s+", " ", query).strip()
+
+
+class Node:
+    def __init__(self, element_id, labels, properties):
+        self.id = element_id
+        self.labels = frozenset(labels)
+        self._properties = properties
+
+    def __getitem__(self, key):
+        return self._properties[key]
+
+    def get(self, key, default=None):
+        return self._properties.get(key, default)
+
+
+class Record:
+    def __init__(self, values):
+        self._values = values
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def get(self, key, default=None):
+        return self._values.get(key, default)
+
+    def keys(self):
+        return list(self._values)
+
+    def values(self):
+        return list(self._values.values())
+
+    def data(self):
+        return {key: (value._properties if isinstance(value, Node) else value)
+                for key, value in self._values.items()}
+
+
+class Counters:
+    def __init__(self, **counts):
+        self.nodes_created = counts.get("nodes_created", 0)
+        self.nodes_deleted = counts.get("nodes_deleted", 0)
+        self.relationships_created = counts.get("relationships_created", 0)
+        self.relationships_deleted = counts.get("relationships_deleted", 0)
+        self.properties_set = counts.get("properties_set", 0)
+
+
+class Summary:
+    def __init__(self, counters):
+        self.counters = counters
+
+
+class Result:
+    def __init__(self, records, counters):
+        self._records = [Record(values) for values in records]
+        self._summary = Summary(counters)
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def single(self, strict=False):
+        return self._records[0] if self._records else None
+
+    def data(self):
+        return [record.data() for record in self._records]
+
+    def consume(self):
+        return self._summary
+
+
+class Transaction:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def run(self, query, parameters=None, **kwargs):
+        params = dict(parameters or {}, **kwargs)
+        time.sleep(self.graph.latency)
+        # neo4j.Query wraps the text together with a timeout.
+        return self.graph.execute(getattr(query, "text", query), params)
+
+
+class Session:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        pass
+
+    def run(self, query, parameters=None, **kwargs):
+        return Transaction(self.graph).run(query, parameters, **kwargs)
+
+    def execute_read(self, work, *args, **kwargs):
+        return work(Transaction(self.graph), *args, **kwargs)
+
+    execute_write = execute_read
+
+
+class Driver:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def session(self, **kwargs):
+        return Session(self.graph)
+
+    def close(self):
+        pass
+
+
+class AsyncResult(Result):
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for record in self._records:
+            yield record
+
+    async def single(self, strict=False):
+        return Result.single(self, strict)
+
+    async def data(self):
+        return Result.data(self)
+
+    async def consume(self):
+        return self._summary
+
+
+class AsyncTransaction:
+    def __init__(self, graph):
+        self.graph = graph
+
+    async def run(self, query, parameters=None, **kwargs):
+        params = dict(parameters or {}, **kwargs)
+        await asyncio.sleep(self.graph.latency)
+        result = self.graph.execute(getattr(query, "text", query), params)
+        async_result = AsyncResult([], result._summary.counters)
+        async_result._records = result._records
+        return async_result
+
+
+class AsyncSession:
+    def __init__(self, graph):
+        self.graph = graph
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        pass
+
+    async def run(self, query, parameters=None, **kwargs):
+        return await AsyncTransaction(self.graph).run(query, parameters, **kwargs)
+
+    async def execute_read(self, work, *args, **kwargs):
+        return await work(AsyncTransaction(self.graph), *args, **kwargs)
+
+    execute_write = execute_read
+
+
+class AsyncDriver:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def session(self, **kwargs):
+        return AsyncSession(self.graph)
+
+    async def close(self):
+        pass
+
+
+class Graph:
+    """
+    Nodes are keyed by an internal integer id (what id(n) returns); `index` maps
+    (label, id property) to it for the apps that use their own ids.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.nodes = {}
+        self.index = {}
+        self.edges = {}  # (type, start, end) -> properties
+        self.outgoing = {}  # (type, start) -> {end: None}, insertion ordered
+        self.incoming = {}  # (type, end) -> {start: None}
+        self._ids = itertools.count()
+        self.handlers = []
+        self.unhandled = {}  # normalized query -> times seen
+        register_handlers(self)
+
+    def driver(self):
+        return Driver(self)
+
+    def async_driver(self):
+        return AsyncDriver(self)
+
+    # -- storage -------------------------------------------------------------
+
+    def add_node(self, label, **properties):
+        node_id = next(self._ids)
+        self.nodes[node_id] = Node(node_id, [label], properties)
+        if "id" in properties:
+            self.index[(label, properties["id"])] = node_id
+        return self.nodes[node_id]
+
+    def find(self, label, key):
+        node_id = self.index.get((label, key))
+        return None if node_id is None else self.nodes[node_id]
+
+    def add_edge(self, rel_type, start, end, **properties):
+        """
+        Returns True when the edge is new.
+        """
+        key = (rel_type, start.id, end.id)
+        created = key not in self.edges
+        if created:
+            self.edges[key] = properties
+        self.outgoing.setdefault((rel_type, start.id), {})[end.id] = None
+        self.incoming.setdefault((rel_type, end.id), {})[start.id] = None
+        return created
+
+    def neighbours(self, rel_type, node, incoming=False):
+        adjacency = self.incoming if incoming else self.outgoing
+        return [self.nodes[other] for other in adjacency.get((rel_type, node.id), ())]
+
+    def undirected(self, node_id, rel_types):
+        for rel_type in rel_types:
+            for other in self.outgoing.get((rel_type, node_id), ()):
+                yield other, (node_id, other, rel_type)
+            for other in self.incoming.get((rel_type, node_id), ()):
+                yield other, (other, node_id, rel_type)
+
+    def bfs(self, start, rel_types, max_depth):
+        """
+        Breadth-first search from `start`; returns {node: (parent, edge)} for every reached node.
+        """
+        reached = {start: (None, None)}
+        frontier = [start]
+        for _ in range(max_depth):
+            next_frontier = []
+            for node_id in frontier:
+                for other, edge in self.undirected(node_id, rel_types):
+                    if other not in reached:
+                        reached[other] = (node_id, edge)
+                        next_frontier.append(other)
+            frontier = next_frontier
+        return reached
+
+    def delete_edges(self, predicate):
+        doomed = [key for key in self.edges if predicate(*key)]
+        for rel_type, start, end in doomed:
+            del self.edges[(rel_type, start, end)]
+            self.outgoing[(rel_type, start)].pop(end, None)
+            self.incoming[(rel_type, end)].pop(start, None)
+        return len(doomed)
+
+    # -- query dispatch ------------------------------------------------------
+
+    def on(self, *fragments):
+        def register(handler):
+            self.handlers.append((fragments, handler))
+            return handler
+        return register
+
+    def execute(self, query, params):
+        query = normalize(query)
+        for fragments, handler in self.handlers:
+            if all(fragment in query for fragment in fragments):
+                outcome = handler(query, params)
+                if isinstance(outcome, tuple):
+                    return Result(outcome[0], outcome[1])
+                return Result(outcome, Counters())
+        self.unhandled[query] = self.unhandled.get(query, 0) + 1
+        raise UnhandledQuery(query)
+
+
+def as_utc(value):
+    # What the real driver hands back for a datetime() written without a zone.
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def user_row(node):
+    props = node._properties
+    return {"id": node.id, "name": props.get("name"), "email": props.get("email"),
+            "age": props.get("age"), "gender": props.get("gender")}
+
+
+def register_handlers(graph):
+    on = graph.on
+
+    # Schema statements (ensure_schema in app.py and CheckIN_OUT.py) have nothing to model.
+
+    @on("IF NOT EXISTS")
+    def schema(query, params):
+        return []
+
+    # relation.py: users addressed by internal id, arbitrary relationship types.
+
+    @on("CREATE (u:User {name: $name")
+    def relation_create_user(query, params):
+        node = graph.add_node("User", **{k: params[k] for k in ("name", "email", "age", "gender")})
+        return [user_row(node)], Counters(nodes_created=1)
+
+    @on("MATCH (u:User) WHERE id(u) > $after")
+    def relation_users_page(query, params):
+        ids = sorted(i for i, node in graph.nodes.items() if "User" in node.labels and i > params["after"])
+        return [user_row(graph.nodes[i]) for i in ids[:params["limit"]]]
+
+    @on("MATCH (u:User) RETURN id(u) AS id")
+    def relation_all_users(query, params):
+        return [user_row(node) for node in graph.nodes.values() if "User" in node.labels]
+
+    @on("WHERE id(u) = $user_id SET")
+    def relation_update_user(query, params):
+        node = graph.nodes.get(params["user_id"])
+        if node is None:
+            return []
+        for key in ("name", "email", "age", "gender"):
+            if key in params:
+                node._properties[key] = params[key]
+        return [user_row(node)]
+
+    @on("WHERE id(u) = $user_id DELETE u")
+    def relation_delete_user(query, params):
+        node = graph.nodes.pop(params["user_id"], None)
+        return [], Counters(nodes_deleted=int(node is not None))
+
+    @on("WHERE id(u) = $user_id RETURN")
+    def relation_read_user(query, params):
+        node = graph.nodes.get(params["user_id"])
+        return [] if node is None else [user_row(node)]
+
+    @on("UNWIND $rels AS rel", "MERGE (source)-[:")
+    def relation_create_relationships(query, params):
+        rel_type = re.search(r"\[:(\w+)\]", query).group(1)
+        written = []
+        created = 0
+        for rel in params["rels"]:
+            source = graph.nodes.get(rel["source_id"])
+            target = graph.nodes.get(rel["target_id"])
+            if source is not None and target is not None:
+                created += graph.add_edge(rel_type, source, target)
+                written.append({"index": rel["index"]})
+        return written, Counters(relationships_created=created)
+
+    @on("OPTIONAL MATCH path = (start)-[")
+    def relation_neighborhood(query, params):
+        if params["user_id"] not in graph.nodes:
+            return []
+        rel_types, depth = re.search(r"\[:([\w|]+)\*1\.\.(\d+)\]", query).groups()
+        reached = graph.bfs(params["user_id"], rel_types.split("|"), int(depth))
+        # One "path" per reached node: the BFS tree edge that discovered it.
+        edges = [[list(edge)] for parent, edge in reached.values() if edge is not None]
+        return [{"start": params["user_id"], "edges": path} for path in edges[:params["limit"]]] or \
+            [{"start": params["user_id"], "edges": []}]
+
+    @on("shortestPath((source)-[")
+    def relation_shortest_path(query, params):
+        source, target = params["from_id"], params["to_id"]
+        if source not in graph.nodes or target not in graph.nodes:
+            return []
+        rel_types, depth = re.search(r"\[:([\w|]+)\*1\.\.(\d+)\]", query).groups()
+        reached = graph.bfs(source, rel_types.split("|"), int(depth))
+        if target not in reached:
+            return []
+        nodes, edges = [target], []
+        while reached[nodes[-1]][0] is not None:
+            parent, edge = reached[nodes[-1]]
+            nodes.append(parent)
+            edges.append(list(edge))
+        return [{"nodes": nodes[::-1], "edges": edges[::-1]}]
+
+    @on("MATCH (u:User) WHERE id(u) = $from_id RETURN [id(u)] AS nodes")
+    def relation_trivial_path(query, params):
+        return [{"nodes": [params["from_id"]], "edges": []}] if params["from_id"] in graph.nodes else []
+
+    @on("MERGE (source)-[r:")
+    def relation_create_relationship(query, params):
+        source = graph.nodes.get(params["source_id"])
+        target = graph.nodes.get(params["target_id"])
+        if source is None or target is None:
+            return []
+        rel_type = re.search(r"\[r:(\w+)\]", query).group(1)
+        graph.add_edge(rel_type, source, target)
+        return [{"relationship_id": len(graph.edges)}], Counters(relationships_created=1)
+
+    @on("MATCH (source:User)-[r:", "DELETE r")
+    def relation_delete_relationship(query, params):
+        rel_type = re.search(r"\[r:(\w+)\]", query).group(1)
+        deleted = graph.delete_edges(lambda t, s, e: t == rel_type and s == params["source_id"]
+                                     and e == params["target_id"])
+        return [], Counters(relationships_deleted=deleted)
+
+    # app.py: users and posts addressed by their own string ids.
+
+    def bump(node, counter):
+        node._properties[counter] = node._properties.get(counter, 0) + 1
+
+    @on("MATCH (u:User {id: $user_id}) RETURN u.id AS id, coalesce(u.follower_count")
+    def social_user_counts(query, params):
+        user = graph.find("User", params["user_id"])
+        return [] if user is None else [{"id": user.get("id"), "followers": user.get("follower_count", 0),
+                                         "following": user.get("following_count", 0)}]
+
+    @on("MATCH (p:Post {id: $post_id}) RETURN p.id AS id, coalesce(p.like_count")
+    def social_post_counts(query, params):
+        post = graph.find("Post", params["post_id"])
+        return [] if post is None else [{"id": post.get("id"), "likes": post.get("like_count", 0)}]
+
+    @on("WHERE n.id > $after", "FOREACH (duplicate IN tail(rels) | DELETE duplicate)")
+    def social_dedupe(query, params):
+        # Edges are keyed by (type, start, end) here, so there is never a duplicate to remove.
+        users = sorted(key for (label, key) in graph.index if label == "User" and key > params["after"])
+        batch = users[:params["batch_size"]]
+        return [{"last_id": batch[-1] if batch else None, "scanned": len(batch), "repaired": 0}]
+
+    @on("WHERE n.id > $after", "ORDER BY n.id LIMIT $batch_size")
+    def social_reconcile(query, params):
+        label, counters = ("User", {"follower_count": ("FOLLOW", True), "following_count": ("FOLLOW", False)}) \
+            if "MATCH (n:User)" in query else ("Post", {"like_count": ("LIKE", True)})
+        batch = sorted((node for (node_label, key), node_id in graph.index.items()
+                        if node_label == label and key > params["after"]
+                        for node in [graph.nodes[node_id]]), key=lambda n: n.get("id"))[:params["batch_size"]]
+        repaired = 0
+        for node in batch:
+            actual = {counter: len(graph.neighbours(rel_type, node, incoming))
+                      for counter, (rel_type, incoming) in counters.items()}
+            if any(node.get(counter, 0) != value for counter, value in actual.items()):
+                repaired += 1
+                node._properties.update(actual)
+        last_id = batch[-1].get("id") if batch else None
+        return [{"last_id": last_id, "scanned": len(batch), "repaired": repaired}]
+
+    @on("CREATE (u:User {id: $user_id")
+    def social_create_user(query, params):
+        node = graph.add_node("User", id=params["user_id"], name=params["name"])
+        return [{"u": node}], Counters(nodes_created=1)
+
+    @on("CREATE (author)-[:POSTED]->(p:Post")
+    def social_create_authored_post(query, params):
+        author = graph.find("User", params["author_id"])
+        if author is None:
+            return []
+        node = graph.add_node("Post", id=params["post_id"], content=params["content"],
+                              timestamp=params["timestamp"])
+        graph.add_edge("POSTED", author, node)
+        followers = graph.neighbours("FOLLOW", author, incoming=True)
+        follower_ids = [f.get("id") for f in followers] if len(followers) <= params["threshold"] else []
+        return [{"p": node, "follower_count": len(followers), "follower_ids": follower_ids}], \
+            Counters(nodes_created=1, relationships_created=1)
+
+    def post_entries(authors, limit):
+        entries = [{"timestamp": post.get("timestamp"), "id": post.get("id"), "author_id": author.get("id")}
+                   for author in authors for post in graph.neighbours("POSTED", author)]
+        entries.sort(key=lambda e: e["timestamp"], reverse=True)
+        return entries[:limit]
+
+    @on("OPTIONAL MATCH (u)-[:FOLLOW]->(author:User)-[:POSTED]->(p:Post)")
+    def social_timeline(query, params):
+        user = graph.find("User", params["user_id"])
+        if user is None:
+            return []
+        # OPTIONAL MATCH: a user who follows no posts still yields one all-null row.
+        return post_entries(graph.neighbours("FOLLOW", user), params["limit"]) \
+            or [{"timestamp": None, "id": None, "author_id": None}]
+
+    @on("MATCH (author:User {id: $author_id})-[:POSTED]->(p:Post)")
+    def social_authored(query, params):
+        author = graph.find("User", params["author_id"])
+        return [] if author is None else post_entries([author], params["limit"])
+
+    @on("MATCH (p:Post)", "ORDER BY p.timestamp, p.id")
+    def social_list_posts(query, params):
+        temporal_only = "p.timestamp IS :: ZONED DATETIME NOT NULL" in query
+        rows = []
+        for (label, key), node_id in graph.index.items():
+            post = graph.nodes[node_id]
+            timestamp = post.get("timestamp")
+            if label != "Post" or timestamp is None:
+                continue
+            if not isinstance(timestamp, datetime):
+                # Comparing a string with a datetime is null in Cypher, so only the
+                # unfiltered listing would return it; ORDER BY puts it after every datetime.
+                if temporal_only or "since" in params or "until" in params:
+                    continue
+                if "after_id" in params and key <= params["after_id"]:
+                    continue
+            else:
+                if "since" in params and timestamp < params["since"]:
+                    continue
+                if "until" in params and timestamp >= params["until"]:
+                    continue
+                if "after_id" in params and (timestamp, key) <= (params["after_timestamp"], params["after_id"]):
+                    continue
+            rows.append({"id": key, "content": post.get("content"), "timestamp": timestamp})
+        rows.sort(key=lambda row: (isinstance(row["timestamp"], str), row["timestamp"], row["id"]))
+        return rows[:params["limit"]]
+
+    @on("WHERE p.timestamp IS :: STRING")
+    def social_string_timestamps(query, params):
+        rows = [{"id": key, "timestamp": graph.nodes[node_id].get("timestamp")}
+                for (label, key), node_id in graph.index.items()
+                if label == "Post" and isinstance(graph.nodes[node_id].get("timestamp"), str)]
+        return rows[:params["batch_size"]]
+
+    @on("UNWIND $rows AS row", "SET p.timestamp = row.timestamp")
+    def social_write_timestamps(query, params):
+        for row in params["rows"]:
+            graph.find("Post", row["id"])._properties["timestamp"] = row["timestamp"]
+        return []
+
+    @on("SET p.timestamp_unparsed = p.timestamp")
+    def social_unparsed_timestamps(query, params):
+        for post_id in params["post_ids"]:
+            properties = graph.find("Post", post_id)._properties
+            properties["timestamp_unparsed"] = properties.pop("timestamp")
+        return []
+
+    @on("RETURN collect({id: candidate.id, name: candidate.name, mutual: mutual}) AS recommendations")
+    def social_recommendations(query, params):
+        me = graph.find("User", params["user_id"])
+        if me is None:
+            return []
+        following = graph.neighbours("FOLLOW", me)
+        followed = {node.id for node in following}
+        mutual = {}
+        for friend in following[:params["max_friends"]]:
+            for candidate in graph.neighbours("FOLLOW", friend)[:params["max_fanout"]]:
+                if candidate.id != me.id and candidate.id not in followed:
+                    mutual[candidate.id] = mutual.get(candidate.id, 0) + 1
+        ranked = sorted(mutual.items(), key=lambda item: (-item[1], graph.nodes[item[0]].get("id")))
+        return [{"recommendations": [{"id": graph.nodes[node_id].get("id"), "name": graph.nodes[node_id].get("name"),
+                                      "mutual": count} for node_id, count in ranked[:params["k"]]]}]
+
+    @on("MATCH (u:User)-[r:FOLLOW]->() WHERE r.created_at >= $since")
+    def social_active_users(query, params):
+        active = {}
+        for (rel_type, start, _), properties in graph.edges.items():
+            if rel_type in ("FOLLOW", "LIKE") and properties.get("created_at", 0) >= params["since"]:
+                active[graph.nodes[start].get("id")] = None
+        return [{"id": user_id} for user_id in list(active)[:params["limit"]]]
+
+    @on("WHERE c.id IN $celebrities")
+    def social_celebrity_followees(query, params):
+        user = graph.find("User", params["user_id"])
+        wanted = set(params["celebrities"])
+        followees = [] if user is None else graph.neighbours("FOLLOW", user)
+        return [{"id": c.get("id")} for c in followees if c.get("id") in wanted]
+
+    @on("UNWIND $post_ids AS post_id")
+    def social_posts(query, params):
+        posts = (graph.find("Post", post_id) for post_id in params["post_ids"])
+        return [{"id": p.get("id"), "content": p.get("content"), "timestamp": p.get("timestamp")}
+                for p in posts if p is not None]
+
+    @on("CREATE (p:Post")
+    def social_create_post(query, params):
+        node = graph.add_node("Post", id=params["post_id"], content=params["content"],
+                              timestamp=params["timestamp"])
+        return [{"p": node}], Counters(nodes_created=1)
+
+    @on("MATCH (follower:User {id: $follower_id})", "MERGE (follower)-[r:FOLLOW]->(followee)")
+    def social_follow(query, params):
+        follower = graph.find("User", params["follower_id"])
+        followee = graph.find("User", params["followee_id"])
+        if follower is None or followee is None:
+            return []
+        if graph.add_edge("FOLLOW", follower, followee, created_at=now_ms()):
+            bump(follower, "following_count")
+            bump(followee, "follower_count")
+        return [{"follower": follower, "followee": followee}], Counters(relationships_created=1)
+
+    @on("MATCH (user:User {id: $user_id})", "MERGE (user)-[r:LIKE]->(post)")
+    def social_like(query, params):
+        user = graph.find("User", params["user_id"])
+        post = graph.find("Post", params["post_id"])
+        if user is None or post is None:
+            return []
+        created = graph.add_edge("LIKE", user, post, created_at=now_ms())
+        if created:
+            bump(post, "like_count")
+        return [{"user": user, "post": post}], Counters(relationships_created=int(created))
+
+    @on("WHERE r.created_at >= $since", "count(*) AS likes")
+    def social_recent_likes(query, params):
+        counts = {}
+        for (rel_type, _, end), properties in graph.edges.items():
+            created_at = properties.get("created_at")
+            if rel_type == "LIKE" and created_at is not None and created_at >= params["since"]:
+                key = (graph.nodes[end].get("id"), created_at // params["bucket_ms"])
+                counts[key] = counts.get(key, 0) + 1
+        return [{"post_id": post_id, "bucket": bucket, "likes": likes} for (post_id, bucket), likes in counts.items()]
+
+    @on("WITH node, coalesce(r.created_at, 0) AS created_at")
+    def social_edge_page(query, params):
+        match = re.search(r"MATCH (\(:?(\w*):(\w+)[^)]*\))-\[r:(\w+)\]->(\(:?(\w*):(\w+)[^)]*\))", query)
+        start, start_var, start_label, rel_type, end, end_var, end_label = match.groups()
+        incoming = end_var == ""  # the anchor is the end node: list the nodes pointing at it
+        anchor = graph.find(end_label if incoming else start_label, params["key"])
+        if anchor is None:
+            return []
+        adjacency = graph.incoming if incoming else graph.outgoing
+        rows = []
+        for other_id in adjacency.get((rel_type, anchor.id), ()):
+            key = (rel_type, other_id, anchor.id) if incoming else (rel_type, anchor.id, other_id)
+            node = graph.nodes[other_id]
+            rows.append((graph.edges[key].get("created_at", 0), node.get("id"), node))
+        rows.sort(key=lambda row: row[:2], reverse=True)
+        if params["after_created_at"] is not None:
+            after = (params["after_created_at"], params["after_id"])
+            rows = [row for row in rows if row[:2] < after]
+        fields = re.findall(r"node\.(\w+) AS (\w+)", query.split("RETURN", 1)[1])
+        return [dict({"created_at": created_at}, **{alias: node.get(prop) for prop, alias in fields})
+                for created_at, _, node in rows[:params["limit"]]]
+
+    @on("RETURN EXISTS { (a)-[:FOLLOW]->(b) }")
+    def social_check_follow(query, params):
+        a = graph.find("User", params["follower_id"])
+        b = graph.find("User", params["followee_id"])
+        if a is None or b is None:
+            return []
+        return [{"follows": ("FOLLOW", a.id, b.id) in graph.edges, "followed_by": ("FOLLOW", b.id, a.id) in graph.edges}]
+
+    @on("UNWIND $rows AS row", "MERGE (u:User {id: row.id})")
+    def social_import_users(query, params):
+        for row in params["rows"]:
+            node = graph.find("User", row["id"]) or graph.add_node("User", id=row["id"])
+            node._properties["name"] = row["name"]
+        return [{"written": len(params["rows"])}]
+
+    @on("UNWIND $rows AS row", "MERGE (p:Post {id: row.id})")
+    def social_import_posts(query, params):
+        for row in params["rows"]:
+            node = graph.find("Post", row["id"]) or graph.add_node("Post", id=row["id"])
+            node._properties.update(content=row["content"], timestamp=row["timestamp"])
+            author = graph.find("User", row.get("author_id"))
+            if author is not None:
+                graph.add_edge("POSTED", author, node)
+        return [{"written": len(params["rows"])}]
+
+    def collect_created(query, rows):
+        # As written: every row whose edge carries this query's timestamp(), once each with DISTINCT.
+        if "collect(DISTINCT CASE" not in query:
+            return rows
+        unique = []
+        for row in rows:
+            if row not in unique:
+                unique.append(row)
+        return unique
+
+    @on("UNWIND $rows AS row", "MERGE (follower)-[r:FOLLOW]->(followee)")
+    def social_import_follows(query, params):
+        written, created, now = 0, [], now_ms()
+        for row in params["rows"]:
+            follower = graph.find("User", row["follower_id"])
+            followee = graph.find("User", row["followee_id"])
+            if follower is not None and followee is not None:
+                if graph.add_edge("FOLLOW", follower, followee, created_at=now):
+                    bump(follower, "following_count")
+                    bump(followee, "follower_count")
+                if graph.edges[("FOLLOW", follower.id, followee.id)].get("created_at") == now:
+                    created.append(row)
+                written += 1
+        return [{"written": written, "created": collect_created(query, created)}]
+
+    @on("UNWIND $rows AS row", "MERGE (user)-[r:LIKE]->(post)")
+    def social_import_likes(query, params):
+        written, created, now = 0, [], now_ms()
+        for row in params["rows"]:
+            user = graph.find("User", row["user_id"])
+            post = graph.find("Post", row["post_id"])
+            if user is not None and post is not None:
+                if graph.add_edge("LIKE", user, post, created_at=now):
+                    bump(post, "like_count")
+                if graph.edges[("LIKE", user.id, post.id)].get("created_at") == now:
+                    created.append(row)
+                written += 1
+        return [{"written": written, "created": collect_created(query, created)}]
+
+    # CheckIN_OUT.py: people checking in to organizations.
+
+    @on("SET org.opening_time = $opening_time")
+    def checkin_set_times(query, params):
+        org = graph.find("Organization", params["org_id"])
+        if org is None:
+            return []
+        org._properties.update(opening_time=params["opening_time"], closing_time=params["closing_time"])
+        return [{"org": org}]
+
+    @on("RETURN org.opening_time AS opening_time")
+    def checkin_hours(query, params):
+        org = graph.find("Organization", params["org_id"])
+        if org is None:
+            return []
+        return [{"opening_time": org.get("opening_time"), "closing_time": org.get("closing_time")}]
+
+    @on("UNWIND $org_ids AS org_id", "RETURN org.id AS id, org.opening_time AS opening_time")
+    def checkin_hours_many(query, params):
+        orgs = (graph.find("Organization", org_id) for org_id in params["org_ids"])
+        return [{"id": org.get("id"), "opening_time": org.get("opening_time"), "closing_time": org.get("closing_time")}
+                for org in orgs if org is not None]
+
+    @on("UNWIND $rows AS row", "MERGE (u)-[:CHECKED_IN]->(org)")
+    def checkin_merge_many(query, params):
+        records = []
+        for row in params["rows"]:
+            org = graph.find("Organization", row["org_id"])
+            person = graph.find("Person", row["user_id"])
+            hours_current = (org is not None and org.get("opening_time") == row["opening_time"]
+                             and org.get("closing_time") == row["closing_time"])
+            if person is not None and hours_current:
+                graph.add_edge("CHECKED_IN", person, org)
+            records.append({"index": row["index"], "person_found": person is not None,
+                            "hours_current": hours_current})
+        return records
+
+    @on("MERGE (u)-[:CHECKED_IN]->(org)", "AS hours_current")
+    def checkin_merge(query, params):
+        org = graph.find("Organization", params["org_id"])
+        if org is None:
+            return []
+        person = graph.find("Person", params["user_id"])
+        hours_current = (org.get("opening_time") == params["opening_time"]
+                         and org.get("closing_time") == params["closing_time"])
+        checked_in = person is not None and hours_current
+        if checked_in:
+            graph.add_edge("CHECKED_IN", person, org)
+        return [{"person_found": person is not None, "hours_current": hours_current, "checked_in": checked_in}]
+
+    @on("-[:CHECKED_IN]->(org:Organization {id: $org_id})", "RETURN u.role AS role")
+    def checkin_active_users(query, params):
+        org = graph.find("Organization", params["org_id"])
+        if org is None:
+            return []
+        admins_only = "u.role = 'admin'" in query
+        groups = {}
+        for person in graph.neighbours("CHECKED_IN", org, incoming=True):
+            if admins_only and person.get("role") != "admin":
+                continue
+            groups.setdefault(person.get("role"), []).append({"id": person.get("id"), "name": person.get("name")})
+        return [{"role": role, "users": users} for role, users in groups.items()]
+
+    @on("-[r:CHECKED_IN]->(org)", "AS hours_current", "DELETE r")
+    def checkin_checkout_current(query, params):
+        org = graph.find("Organization", params["org_id"])
+        if org is None:
+            return []
+        hours_current = org.get("closing_time") == params["closing_time"]
+        removed = [person for person in graph.neighbours("CHECKED_IN", org, incoming=True)
+                   if hours_current and person.get("role") != "admin"]
+        graph.delete_edges(lambda t, s, e: t == "CHECKED_IN" and e == org.id
+                           and any(person.id == s for person in removed))
+        return ([{"hours_current": hours_current, "checked_out": len(removed)}],
+                Counters(relationships_deleted=len(removed)))
+
+    @on("-[r:CHECKED_IN]->(org:Organization {id: $org_id})", "DELETE r")
+    def checkin_checkout(query, params):
+        org = graph.find("Organization", params["org_id"])
+        if org is None:
+            return []
+        admin = "{role: 'admin'}" in query
+        removed = [person for person in graph.neighbours("CHECKED_IN", org, incoming=True)
+                   if (person.get("role") == "admin") == admin]
+        graph.delete_edges(lambda t, s, e: t == "CHECKED_IN" and e == org.id
+                           and any(person.id == s for person in removed))
+        return ([{"admin": person} for person in removed] if admin else [],
+                Counters(relationships_deleted=len(removed)))
@@ -0,0 +1,25 @@
+from starlette.responses import Response
+import hashlib
+
+from fastjson import dumps
+
+
+def make_etag(content) -> str:
+    """
+    Strong ETag from a hash of the JSON-serializable response content.
+    """
+    return '"' + hashlib.blake2b(dumps(content), digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    # If-None-Match uses weak comparison and may list several tags or "*".
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
@@ -0,0 +1,29 @@
+"""
+Opaque pagination cursors shared by the apps: a JSON list of values, base64url
+encoded. Clients only ever hand a cursor back; a tampered one is a 400.
+"""
+import base64
+import binascii
+import json
+
+from fastapi import HTTPException
+
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps(values).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types):
+    """
+    Decode a cursor made by encode_cursor, checking it holds one value of each of `types`.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(types) or \
+            not all(isinstance(value, kind) for value, kind in zip(values, types)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
@@ -0,0 +1,31 @@
+from starlette.responses import Response
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder is used instead
+    orjson = None
+
+
+# Opt-in: list routes return FastJSONResponse instead of going through response_model.
+FAST_JSON_RESPONSES = os.environ.get("FAST_JSON_RESPONSES", "").lower() in ("1", "true", "yes")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """
+    Renders plain dicts/lists straight to JSON bytes. Returning a Response from a route
+    makes FastAPI skip response_model validation, so callers must already emit the
+    response schema's fields.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
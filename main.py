@@ -1,21 +1,79 @@
-from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy import create_engine, delete, event, func, inspect, select, text, update, Column, Index, Integer, String
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from pydantic import BaseModel
-from fastapi import FastAPI, Depends, HTTPException
+from sqlalchemy.dialects import postgresql, sqlite
+from pydantic import BaseModel, ValidationError
+from fastapi import APIRouter, FastAPI, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List
 from typing import Optional
+import json
+import os
+import re
+
+from cache import MISSING, CacheBackend, LRUCache
+from conditional import etag_matches, make_etag, not_modified
+from cursor import decode_cursor, encode_cursor
+from fastjson import FastJSONResponse
+import fastjson
 
 
 app = FastAPI()
 
-DATABASE_URL = "sqlite:///.Base.metadata.create_all(bind=engine)"
+# An async driver in the URL (e.g. sqlite+aiosqlite:///..., postgresql+asyncpg://...)
+# switches the CRUD routes to AsyncSession; everything else keeps the sync engine.
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///.Base.metadata.create_all(bind=engine)")
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",  # readers no longer block behind a writer
+    "synchronous": "NORMAL",  # fsync at checkpoints only, safe with WAL
+    "cache_size": -64000,  # 64 MiB page cache (negative means KiB)
+    "mmap_size": 268435456,  # 256 MiB memory-mapped I/O
+    "busy_timeout": 5000,  # wait for the writer lock instead of failing immediately
+}
+
+database_url = make_url(DATABASE_URL)
+ASYNC_MODE = database_url.get_dialect().is_async
+IS_SQLITE = database_url.get_backend_name() == "sqlite"
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+sync_url = database_url.set(drivername=database_url.get_backend_name()) if ASYNC_MODE else database_url
+engine = create_engine(sync_url, connect_args={"check_same_thread": False} if IS_SQLITE else {})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+if ASYNC_MODE:
+    async_engine = create_async_engine(database_url)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+if IS_SQLITE:
+    event.listen(engine, "connect", set_sqlite_pragmas)
+    if ASYNC_MODE:
+        event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+
+# Read-through cache for GET /users/{user_id}. Values are plain dicts, never ORM
+# instances, so any CacheBackend (including an out-of-process one) can hold them.
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", "60"))
+user_cache: CacheBackend = LRUCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+# The CRUD routes are registered on one of these at the bottom of the module,
+# after the fixed /users/... paths that must match before /users/{user_id}.
+sync_router = APIRouter()
+async_router = APIRouter()
+
 
 class User(Base):
     __tablename__ = "users"
@@ -26,7 +84,70 @@ class User(Base):
     age = Column(Integer)  # New age column
     gender = Column(String)
 
+    __table_args__ = (
+        # Serves gender equality plus an age range in /users/search, and GROUP BY gender in /users/stats.
+        Index("ix_users_gender_age", "gender", "age"),
+        # Serves age-only ranges and the age histogram.
+        Index("ix_users_age", "age"),
+    )
+
 Base.metadata.create_all(bind=engine)
+# create_all skips tables that already exist, so make sure indexes added later are there too.
+for index in User.__table__.indexes:
+    index.create(bind=engine, checkfirst=True)
+
+
+# External-content FTS5 index over users(name, email), kept in sync by triggers so
+# every write path (ORM, bulk INSERT, UPDATE ... RETURNING) is covered.
+FTS_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS users_fts
+    USING fts5(name, email, content='users', content_rowid='id')
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN
+        INSERT INTO users_fts(rowid, name, email) VALUES (new.id, new.name, new.email);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, name, email) VALUES ('delete', old.id, old.name, old.email);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF name, email ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, name, email) VALUES ('delete', old.id, old.name, old.email);
+        INSERT INTO users_fts(rowid, name, email) VALUES (new.id, new.name, new.email);
+    END
+    """,
+]
+
+
+def rebuild_fts(connection):
+    connection.execute(text("INSERT INTO users_fts(users_fts) VALUES ('rebuild')"))
+
+
+def setup_fts():
+    """
+    Create the FTS table and triggers; returns False when FTS5 is unavailable
+    (non-SQLite database, or SQLite built without FTS5).
+    """
+    if not IS_SQLITE:
+        return False
+    is_new = not inspect(engine).has_table("users_fts")
+    try:
+        with engine.begin() as connection:
+            for statement in FTS_SCHEMA:
+                connection.execute(text(statement))
+            if is_new:
+                # Index the rows that were written before the table existed.
+                rebuild_fts(connection)
+    except OperationalError:
+        return False
+    return True
+
+
+FTS_ENABLED = setup_fts()
 
 
 def get_db():
@@ -36,6 +157,10 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 class UserUpdate(BaseModel):
     name: Optional[str] = None
     email: Optional[str] = None
@@ -58,8 +183,164 @@ class UserResponse(BaseModel):
     class Config:
         orm_mode = True
 
+class UserPage(BaseModel):
+    items: List[UserResponse]
+    next_cursor: Optional[str] = None
+
+class GenderCount(BaseModel):
+    gender: Optional[str] = None
+    count: int
+
+class AgeBucket(BaseModel):
+    min_age: int
+    max_age: int
+    count: int
+
+class UserStats(BaseModel):
+    total: int
+    by_gender: List[GenderCount]
+    age_histogram: List[AgeBucket]
+
+
+class BulkRowError(BaseModel):
+    index: int
+    email: Optional[str] = None
+    detail: str
+
+class BulkResult(BaseModel):
+    inserted: int = 0
+    updated: int = 0
+    conflicts: List[BulkRowError] = []
+    errors: List[BulkRowError] = []
+
+
+EXPORT_BATCH_SIZE = 1000
+BULK_CHUNK_SIZE = 1000
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl", "application/ndjson")
+
+
+USER_COLUMNS = (User.id, User.name, User.email, User.age, User.gender)
+
+def rows_to_dicts(result):
+    # Several times cheaper than Row._asdict() per row on large pages.
+    keys = list(result.keys())
+    return [dict(zip(keys, row)) for row in result]
+
+def user_to_dict(user):
+    return {"id": user.id, "name": user.name, "email": user.email, "age": user.age, "gender": user.gender}
+
+def prefix_filter(column, prefix: str):
+    # A range instead of LIKE 'prefix%' so the B-tree index on the column can be used
+    # (SQLite's LIKE is case-insensitive and never uses a plain index). SQLite compares
+    # UTF-8 bytes, so the bound must be the highest code point, not the highest in the BMP.
+    return (column >= prefix) & (column < prefix + "\U0010ffff")
+
+def fts_match_query(q: str) -> str:
+    # Quote every token so user input cannot inject FTS5 syntax, and make each one
+    # a prefix match so partial names ("ali" -> "alice") are found.
+    return " ".join(f'"{token}"*' for token in re.findall(r"\w+", q))
+
+def update_user_statement(user_id: int, user: UserUpdate):
+    """
+    One UPDATE ... RETURNING touching only the fields the client sent; a missing
+    row shows up as no row returned. An empty update degrades to a plain SELECT.
+    """
+    # None keeps meaning "leave unchanged", as it always has for this route.
+    values = user.dict(exclude_unset=True, exclude_none=True)
+    if not values:
+        return select(*User.__table__.columns).where(User.id == user_id)
+    return (
+        update(User.__table__)
+        .where(User.id == user_id)
+        .values(**values)
+        .returning(*User.__table__.columns)
+    )
+
+def delete_user_statement(user_id: int):
+    return delete(User.__table__).where(User.id == user_id).returning(*User.__table__.columns)
+
+def dialect_insert(table):
+    # ON CONFLICT clauses live on the dialect-specific insert constructs.
+    if engine.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
 
-@app.post("/users/", response_model=UserResponse)
+async def iter_bulk_rows(request: Request, result: BulkResult):
+    """
+    Yield (index, object) pairs from either a JSON array body or an NDJSON body.
+    NDJSON is parsed line by line as it arrives, so the upload is never held in memory.
+    """
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith(NDJSON_CONTENT_TYPES):
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array of users")
+        if not isinstance(body, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array of users")
+        for index, obj in enumerate(body):
+            yield index, obj
+        return
+
+    index = 0
+    buffer = b""
+    async for data in request.stream():
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                try:
+                    yield index, json.loads(line)
+                except ValueError as e:
+                    result.errors.append(BulkRowError(index=index, detail=f"Invalid JSON: {e}"))
+                index += 1
+    if buffer.strip():
+        try:
+            yield index, json.loads(buffer)
+        except ValueError as e:
+            result.errors.append(BulkRowError(index=index, detail=f"Invalid JSON: {e}"))
+
+def write_user_chunk(db: Session, chunk, upsert: bool, result: BulkResult):
+    """
+    Write one chunk of validated users as a single executemany INSERT in its own transaction.
+    """
+    rows = {}
+    for index, user in chunk:
+        if user.email in rows:
+            result.conflicts.append(BulkRowError(index=index, email=user.email,
+                                                 detail="Duplicate email in request"))
+            continue
+        rows[user.email] = (index, user.dict())
+
+    existing = dict(db.query(User.email, User.id).filter(User.email.in_(list(rows))))
+    if not upsert:
+        for email in existing:
+            index, _ = rows.pop(email)
+            result.conflicts.append(BulkRowError(index=index, email=email,
+                                                 detail="Email already registered"))
+
+    if rows:
+        stmt = dialect_insert(User.__table__)
+        if upsert:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[User.email],
+                set_={column: stmt.excluded[column] for column in ("name", "age", "gender")},
+            )
+        else:
+            # Guards against rows inserted concurrently since the lookup above.
+            stmt = stmt.on_conflict_do_nothing(index_elements=[User.email])
+        db.execute(stmt, [values for _, values in rows.values()])
+    db.commit()
+
+    if upsert:
+        for user_id in existing.values():
+            user_cache.delete(user_id)
+    updated = len(existing) if upsert else 0
+    result.updated += updated
+    result.inserted += len(rows) - updated
+
+
+@sync_router.post("/users/", response_model=UserResponse)
 def create_user(user: UserCreate, db: Session = Depends(get_db)):
     db_user = User(name=user.name, email=user.email,age=user.age,
         gender=user.gender)
@@ -68,43 +349,283 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
     db.refresh(db_user)
     return db_user
 
-@app.get("/users/",response_model=List[UserResponse])
+@app.post("/users/bulk", response_model=BulkResult)
+async def bulk_create_users(request: Request, upsert: bool = False,
+                            chunk_size: int = Query(BULK_CHUNK_SIZE, ge=1, le=10000)):
+    """
+    Create many users from a JSON array or an NDJSON stream of UserCreate objects.
+    Rows are committed in chunks; with upsert=true an existing email is updated in place,
+    otherwise it is reported as a conflict. Invalid rows are reported under errors.
+    """
+    result = BulkResult()
+    db = SessionLocal()
+    try:
+        chunk = []
+        async for index, obj in iter_bulk_rows(request, result):
+            if not isinstance(obj, dict):
+                result.errors.append(BulkRowError(index=index, detail="Row must be a JSON object"))
+                continue
+            try:
+                chunk.append((index, UserCreate(**obj)))
+            except ValidationError as e:
+                result.errors.append(BulkRowError(index=index, detail=str(e)))
+                continue
+            if len(chunk) >= chunk_size:
+                await run_in_threadpool(write_user_chunk, db, chunk, upsert, result)
+                chunk = []
+        if chunk:
+            await run_in_threadpool(write_user_chunk, db, chunk, upsert, result)
+    finally:
+        db.close()
+
+    result.conflicts.sort(key=lambda conflict: conflict.index)
+    return result
+
+@sync_router.get("/users/",response_model=List[UserResponse])
 def read_users(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
+    if fastjson.FAST_JSON_RESPONSES:
+        result = db.execute(select(*USER_COLUMNS).offset(skip).limit(limit))
+        return FastJSONResponse(rows_to_dicts(result))
     users = db.query(User).offset(skip).limit(limit).all()
     return users
 
-@app.get("/users/{user_id}", response_model=UserResponse)
-def read_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
-        raise HTTPException(status_code=404, detail="User Not Found")
+@app.get("/users/page", response_model=UserPage)
+def read_users_page(cursor: Optional[str] = None, limit: int = Query(10, ge=1, le=1000),
+                    db: Session = Depends(get_db)):
+    """
+    Keyset pagination on User.id: each page is an index range scan starting
+    after the last id of the previous page, so deep pages cost the same as the first.
+    """
+    query = db.query(User).order_by(User.id)
+    if cursor is not None:
+        query = query.filter(User.id > decode_cursor(cursor, int)[0])
+    # Fetch one extra row to know whether another page exists.
+    users = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = encode_cursor(users[-1].id)
+    return {"items": users, "next_cursor": next_cursor}
+
+@app.get("/users/search", response_model=UserPage)
+def search_users(min_age: Optional[int] = None, max_age: Optional[int] = None,
+                 gender: Optional[str] = None, name_prefix: Optional[str] = None,
+                 email_prefix: Optional[str] = None, cursor: Optional[str] = None,
+                 limit: int = Query(10, ge=1, le=1000), db: Session = Depends(get_db)):
+    """
+    Filter users by age range, gender and name/email prefix, keyset-paginated like /users/page.
+    """
+    query = db.query(User)
+    if gender is not None:
+        query = query.filter(User.gender == gender)
+    if min_age is not None:
+        query = query.filter(User.age >= min_age)
+    if max_age is not None:
+        query = query.filter(User.age <= max_age)
+    if name_prefix:
+        query = query.filter(prefix_filter(User.name, name_prefix))
+    if email_prefix:
+        query = query.filter(prefix_filter(User.email, email_prefix))
+    if cursor is not None:
+        query = query.filter(User.id > decode_cursor(cursor, int)[0])
+
+    users = query.order_by(User.id).limit(limit + 1).all()
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = encode_cursor(users[-1].id)
+    return {"items": users, "next_cursor": next_cursor}
+
+@app.get("/users/stats", response_model=UserStats)
+def user_stats(bucket_size: int = Query(10, ge=1), db: Session = Depends(get_db)):
+    """
+    Counts by gender and an age histogram, aggregated by the database with GROUP BY.
+    """
+    by_gender = (
+        db.query(User.gender, func.count())
+        .group_by(User.gender)
+        .order_by(User.gender)
+        .all()
+    )
+    bucket = (User.age // bucket_size) * bucket_size
+    histogram = (
+        db.query(bucket.label("bucket"), func.count())
+        .filter(User.age.isnot(None))
+        .group_by("bucket")
+        .order_by("bucket")
+        .all()
+    )
+    return {
+        "total": sum(count for _, count in by_gender),
+        "by_gender": [{"gender": gender, "count": count} for gender, count in by_gender],
+        "age_histogram": [
+            {"min_age": start, "max_age": start + bucket_size - 1, "count": count}
+            for start, count in histogram
+        ],
+    }
+
+@app.get("/users/fts", response_model=List[UserResponse])
+def full_text_search(q: str, limit: int = Query(10, ge=1, le=100), db: Session = Depends(get_db)):
+    """
+    Token-prefix search over name and email through the FTS5 index, best matches (bm25) first.
+    """
+    if not FTS_ENABLED:
+        raise HTTPException(status_code=501, detail="Full-text search is not available on this database")
+    match = fts_match_query(q)
+    if not match:
+        return []
+    rows = db.execute(
+        text(
+            """
+            SELECT users.id, users.name, users.email, users.age, users.gender
+            FROM users_fts JOIN users ON users.id = users_fts.rowid
+            WHERE users_fts MATCH :match
+            ORDER BY users_fts.rank
+            LIMIT :limit
+            """
+        ),
+        {"match": match, "limit": limit},
+    )
+    return [row._asdict() for row in rows]
+
+@app.post("/users/fts/rebuild")
+def rebuild_full_text_index(db: Session = Depends(get_db)):
+    """
+    Rebuild the FTS index from the users table from scratch.
+    """
+    if not FTS_ENABLED:
+        raise HTTPException(status_code=501, detail="Full-text search is not available on this database")
+    rebuild_fts(db)
+    db.commit()
+    return {"message": "Full-text index rebuilt"}
+
+@app.get("/users/export")
+def export_users():
+    """
+    Stream every user as NDJSON, one JSON object per line, ordered by id.
+    """
+    def generate():
+        # The response outlives the request dependencies, so the stream owns its session.
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(*USER_COLUMNS)
+                .order_by(User.id)
+                .yield_per(EXPORT_BATCH_SIZE)
+            )
+            for row in rows:
+                yield json.dumps(row._asdict()) + "\n"
+        finally:
+            db.close()
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@sync_router.get("/users/{user_id}", response_model=UserResponse)
+def read_user(user_id: int, response: Response, if_none_match: Optional[str] = Header(None),
+              db: Session = Depends(get_db)):
+    # A cache hit answers a matching If-None-Match without touching the database.
+    user = user_cache.get(user_id)
+    if user is MISSING:
+        user = db.query(User).filter(User.id == user_id).first()
+        if user is None:
+            raise HTTPException(status_code=404, detail="User Not Found")
+        user = user_to_dict(user)
+        user_cache.set(user_id, user)
+    etag = make_etag(user)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     return user
 
 
 
 
-@app.put('/users/{user_id}',response_model=UserResponse)
+@sync_router.put('/users/{user_id}',response_model=UserResponse)
 def update_user(user_id: int, user: UserUpdate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.id == user_id).first()
+    row = db.execute(update_user_statement(user_id, user)).first()
 
-    if db_user is None:
+    if row is None:
         raise HTTPException(status_code=404, detail = "User not found")
 
-    db_user.name = user.name if user.name is not None else db_user.name
-    db_user.email = user.email if user.email is not None else db_user.email
-    db_user.age = user.age if user.age is not None else db_user.age
-    db_user.gender = user.gender if user.gender is not None else db_user.gender
     db.commit()
-    db.refresh(db_user)
+    db_user = row._asdict()
+    user_cache.set(user_id, db_user)
     return db_user
 
-@app.delete("/users/{user_id}", response_model=UserResponse)
+@sync_router.delete("/users/{user_id}", response_model=UserResponse)
 def delete_user(user_id: int, db: Session = Depends (get_db)):
-    db_user = db.query(User).filter(User.id == user_id).first()
+    row = db.execute(delete_user_statement(user_id)).first()
 
-    if db_user is None:
+    if row is None:
         raise HTTPException(status_code=404, detail='User not found')
 
-    db.delete(db_user)
     db.commit()
+    user_cache.delete(user_id)
+    return row._asdict()
+
+
+@async_router.post("/users/", response_model=UserResponse)
+async def create_user_async(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = User(name=user.name, email=user.email, age=user.age, gender=user.gender)
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+@async_router.get("/users/", response_model=List[UserResponse])
+async def read_users_async(skip: int = 0, limit: int = 10, db: AsyncSession = Depends(get_async_db)):
+    if fastjson.FAST_JSON_RESPONSES:
+        result = await db.execute(select(*USER_COLUMNS).offset(skip).limit(limit))
+        return FastJSONResponse(rows_to_dicts(result))
+    result = await db.execute(select(User).offset(skip).limit(limit))
+    return result.scalars().all()
+
+@async_router.get("/users/{user_id}", response_model=UserResponse)
+async def read_user_async(user_id: int, response: Response, if_none_match: Optional[str] = Header(None),
+                          db: AsyncSession = Depends(get_async_db)):
+    user = user_cache.get(user_id)
+    if user is MISSING:
+        user = await db.get(User, user_id)
+        if user is None:
+            raise HTTPException(status_code=404, detail="User Not Found")
+        user = user_to_dict(user)
+        user_cache.set(user_id, user)
+    etag = make_etag(user)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return user
+
+@async_router.put("/users/{user_id}", response_model=UserResponse)
+async def update_user_async(user_id: int, user: UserUpdate, db: AsyncSession = Depends(get_async_db)):
+    row = (await db.execute(update_user_statement(user_id, user))).first()
+
+    if row is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    await db.commit()
+    db_user = row._asdict()
+    user_cache.set(user_id, db_user)
     return db_user
+
+@async_router.delete("/users/{user_id}", response_model=UserResponse)
+async def delete_user_async(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    row = (await db.execute(delete_user_statement(user_id))).first()
+
+    if row is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    await db.commit()
+    user_cache.delete(user_id)
+    return row._asdict()
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    """
+    Hit/miss/eviction counters for the user cache, for sizing USER_CACHE_SIZE and USER_CACHE_TTL.
+    """
+    return {"users": user_cache.stats()}
+
+
+app.include_router(async_router if ASYNC_MODE else sync_router)
@@ -1,7 +1,13 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
-from neo4j import GraphDatabase
+from neo4j import AsyncGraphDatabase, Query as CypherQuery
+from neo4j.exceptions import Neo4jError
+import os
+
+from fastjson import FastJSONResponse, dumps
+import fastjson
 
 app = FastAPI()
 
@@ -10,11 +16,34 @@ NEO4J_URI = "bolt://localhost:7687"
 NEO4J_USER = "neo4j"
 NEO4J_PASSWORD = "password1"
 
-driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+NEO4J_MAX_POOL_SIZE = int(os.environ.get("NEO4J_MAX_POOL_SIZE", "100"))
+NEO4J_ACQUISITION_TIMEOUT = float(os.environ.get("NEO4J_ACQUISITION_TIMEOUT", "60"))  # seconds
+
+driver = AsyncGraphDatabase.driver(
+    NEO4J_URI,
+    auth=(NEO4J_USER, NEO4J_PASSWORD),
+    max_connection_pool_size=NEO4J_MAX_POOL_SIZE,
+    connection_acquisition_timeout=NEO4J_ACQUISITION_TIMEOUT,
+)
+
+# Records pulled from the server per round trip while streaming /users/stream.
+STREAM_FETCH_SIZE = 1000
+
+# Relationship types cannot be query parameters, so they are interpolated into
+# Cypher; only names on this list are ever accepted.
+ALLOWED_RELATIONSHIP_TYPES = frozenset(
+    os.environ.get("RELATIONSHIP_TYPES", "FRIEND,FOLLOWS,KNOWS,FAMILY,WORKS_WITH").split(",")
+)
+RELATIONSHIP_BATCH_SIZE = 1000
+
+# Guard rails for the traversal endpoints, so one request cannot hog the database.
+MAX_TRAVERSAL_DEPTH = 4
+MAX_TRAVERSAL_RESULTS = 1000
+TRAVERSAL_TIMEOUT = float(os.environ.get("TRAVERSAL_TIMEOUT", "2.0"))  # seconds
 
 
-def get_db():
-    with driver.session() as session:
+async def get_db():
+    async with driver.session() as session:
         yield session
 
 
@@ -54,47 +83,203 @@ class RelationshipDelete(BaseModel):
     relationship_type: str
 
 
+class RelationshipFailure(BaseModel):
+    index: int
+    detail: str
+
+
+class BulkRelationshipResult(BaseModel):
+    created: int
+    failures: List[RelationshipFailure]
+
+
+class Edge(BaseModel):
+    source: int
+    target: int
+    type: str
+
+
+class Subgraph(BaseModel):
+    nodes: List[int]
+    edges: List[Edge]
+    truncated: bool = False
+
+
+def check_relationship_type(relationship_type: str):
+    if relationship_type not in ALLOWED_RELATIONSHIP_TYPES:
+        raise HTTPException(status_code=400, detail=f"Relationship type '{relationship_type}' is not allowed")
+
+
+def relationship_pattern(types: Optional[str], max_depth: int) -> str:
+    """
+    Variable-length pattern such as `:FRIEND|KNOWS*1..3` from a comma-separated,
+    allowlisted type filter; no filter means any of the allowed types.
+    """
+    names = [name.strip() for name in types.split(",") if name.strip()] if types else []
+    names = names or sorted(ALLOWED_RELATIONSHIP_TYPES)
+    for name in names:
+        check_relationship_type(name)
+    return f":{'|'.join(names)}*1..{max_depth}"
+
+
+async def create_relationship_batch(tx, query: str, rels):
+    """
+    Returns (indexes of the rows whose nodes matched, relationships actually created).
+    """
+    result = await tx.run(query, rels=rels)
+    matched = {record["index"] async for record in result}
+    summary = await result.consume()
+    return matched, summary.counters.relationships_created
+
+
+async def run_traversal(db, query: str, **params):
+    try:
+        result = await db.run(CypherQuery(query, timeout=TRAVERSAL_TIMEOUT), **params)
+        return [record async for record in result]
+    except Neo4jError as e:
+        if "TransactionTimedOut" in (e.code or ""):
+            raise HTTPException(status_code=504, detail="Traversal timed out; narrow depth or types")
+        raise
+
+
 
 @app.post("/users/", response_model=UserResponse)
-def create_user(user: UserCreate, db=Depends(get_db)):
+async def create_user(user: UserCreate, db=Depends(get_db)):
     query = """
     CREATE (u:User {name: $name, email: $email, age: $age, gender: $gender})
     RETURN id(u) AS id, u.name AS name, u.email AS email, u.age AS age, u.gender AS gender
     """
-    result = db.run(query, name=user.name, email=user.email, age=user.age, gender=user.gender)
-    created_user = result.single()
+    result = await db.run(query, name=user.name, email=user.email, age=user.age, gender=user.gender)
+    created_user = await result.single()
 
     if not created_user:
         raise HTTPException(status_code=500, detail="Failed to create user")
 
-    return created_user
+    return created_user.data()
 
 
 @app.get("/users/", response_model=List[UserResponse])
-def read_all_users(db=Depends(get_db)):
+async def read_all_users(limit: int = Query(100, ge=1, le=1000), after: int = -1, db=Depends(get_db)):
+    """
+    One page of users ordered by node id; pass the last id of a page as `after`
+    to get the next one.
+    """
     query = """
-    MATCH (u:User)
+    MATCH (u:User) WHERE id(u) > $after
     RETURN id(u) AS id, u.name AS name, u.email AS email, u.age AS age, u.gender AS gender
+    ORDER BY id(u)
+    LIMIT $limit
     """
-    result = db.run(query)
-    users = [record.data() for record in result]
+    result = await db.run(query, after=after, limit=limit)
+    users = [record.data() async for record in result]
+    if fastjson.FAST_JSON_RESPONSES:
+        # The RETURN clause already projects exactly the UserResponse fields.
+        return FastJSONResponse(users)
     return users
 
 
+@app.get("/users/stream")
+async def stream_all_users():
+    """
+    Every user as NDJSON, written out record by record as the driver receives them.
+    Unordered: an ORDER BY would make the server sort every user before the first record.
+    """
+    query = """
+    MATCH (u:User)
+    RETURN id(u) AS id, u.name AS name, u.email AS email, u.age AS age, u.gender AS gender
+    """
+
+    async def generate():
+        # get_db's session is closed once the route returns, before the body is sent, so the
+        # generator opens its own neo4j session with a fetch size that keeps records flowing.
+        async with driver.session(fetch_size=STREAM_FETCH_SIZE) as session:
+            result = await session.run(query)
+            async for record in result:
+                yield dumps(record.data()) + b"\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+@app.get("/users/{user_id}/neighborhood", response_model=Subgraph)
+async def read_neighborhood(user_id: int, depth: int = Query(1, ge=1, le=MAX_TRAVERSAL_DEPTH),
+                            types: Optional[str] = None,
+                            limit: int = Query(100, ge=1, le=MAX_TRAVERSAL_RESULTS), db=Depends(get_db)):
+    """
+    Users within `depth` hops of the user, in either direction, as node ids plus edges.
+    At most `limit` paths are expanded; `truncated` says whether that cap was hit.
+    """
+    query = f"""
+    MATCH (start:User) WHERE id(start) = $user_id
+    OPTIONAL MATCH path = (start)-[{relationship_pattern(types, depth)}]-(:User)
+    WITH start, path LIMIT $limit
+    RETURN id(start) AS start,
+           [r IN coalesce(relationships(path), []) | [id(startNode(r)), id(endNode(r)), type(r)]] AS edges
+    """
+    # One path past the cap tells a graph that hit it from one with exactly `limit` paths.
+    records = await run_traversal(db, query, user_id=user_id, limit=limit + 1)
+    if not records:
+        raise HTTPException(status_code=404, detail="User Not Found")
+    truncated = len(records) > limit
+    records = records[:limit]
+
+    nodes = {user_id: None}
+    edges = {}
+    for record in records:
+        for source, target, rel_type in record["edges"]:
+            nodes.setdefault(source)
+            nodes.setdefault(target)
+            edges[(source, target, rel_type)] = None
+    return {
+        "nodes": list(nodes),
+        "edges": [{"source": s, "target": t, "type": rel_type} for s, t, rel_type in edges],
+        "truncated": truncated,
+    }
+
+
+@app.get("/paths/shortest", response_model=Subgraph)
+async def read_shortest_path(from_id: int = Query(..., alias="from"), to_id: int = Query(..., alias="to"),
+                             types: Optional[str] = None,
+                             max_depth: int = Query(MAX_TRAVERSAL_DEPTH, ge=1, le=MAX_TRAVERSAL_DEPTH),
+                             db=Depends(get_db)):
+    """
+    One shortest undirected path between two users, at most `max_depth` hops long.
+    """
+    pattern = relationship_pattern(types, max_depth)
+    if from_id == to_id:
+        query = "MATCH (u:User) WHERE id(u) = $from_id RETURN [id(u)] AS nodes, [] AS edges"
+    else:
+        query = f"""
+        MATCH (source:User) WHERE id(source) = $from_id
+        MATCH (target:User) WHERE id(target) = $to_id
+        MATCH path = shortestPath((source)-[{pattern}]-(target))
+        RETURN [n IN nodes(path) | id(n)] AS nodes,
+               [r IN relationships(path) | [id(startNode(r)), id(endNode(r)), type(r)]] AS edges
+        """
+    records = await run_traversal(db, query, from_id=from_id, to_id=to_id)
+    if not records:
+        raise HTTPException(status_code=404, detail="No path found")
+    record = records[0]
+    return {
+        "nodes": record["nodes"],
+        "edges": [{"source": s, "target": t, "type": rel_type} for s, t, rel_type in record["edges"]],
+    }
+
+
 @app.get("/users/{user_id}", response_model=UserResponse)
-def read_user(user_id: int, db=Depends(get_db)):
+async def read_user(user_id: int, db=Depends(get_db)):
     query = """
     MATCH (u:User) WHERE id(u) = $user_id
     RETURN id(u) AS id, u.name AS name, u.email AS email, u.age AS age, u.gender AS gender
     """
-    result = db.run(query, user_id=user_id).single()
+    records = await db.run(query, user_id=user_id)
+    result = await records.single()
     if result is None:
         raise HTTPException(status_code=404, detail="User Not Found")
     return result.data()
 
 
 @app.put("/users/{user_id}", response_model=UserResponse)
-def update_user(user_id: int, user: UserUpdate, db=Depends(get_db)):
+async def update_user(user_id: int, user: UserUpdate, db=Depends(get_db)):
     updates = []
     params = {}
     for key, value in user.dict(exclude_unset=True).items():
@@ -106,22 +291,23 @@ def update_user(user_id: int, user: UserUpdate, db=Depends(get_db)):
     RETURN id(u) AS id, u.name AS name, u.email AS email, u.age AS age, u.gender AS gender
     """
     params["user_id"] = user_id
-    result = db.run(query, **params).single()
+    records = await db.run(query, **params)
+    result = await records.single()
     if result is None:
         raise HTTPException(status_code=404, detail="User Not Found")
     return result.data()
 
 
 @app.delete("/users/{user_id}")
-def delete_user(user_id: int, db=Depends(get_db)):
+async def delete_user(user_id: int, db=Depends(get_db)):
     query = """
     MATCH (u:User) WHERE id(u) = $user_id
     DELETE u
     """
-    result = db.run(query, user_id=user_id)
+    result = await db.run(query, user_id=user_id)
 
 
-    summary = result.consume()
+    summary = await result.consume()
     if summary.counters.nodes_deleted == 0:
         raise HTTPException(status_code=404, detail="User Not Found")
 
@@ -132,52 +318,102 @@ def delete_user(user_id: int, db=Depends(get_db)):
 
 
 @app.post("/relationships/")
-def create_relationship(relationship: RelationshipCreate, db=Depends(get_db)):
-    query = """
-    MATCH (source), (target)
-    WHERE id(source) = $source_id AND id(target) = $target_id
-    CREATE (source)-[r:{relationship_type}]->(target)
+async def create_relationship(relationship: RelationshipCreate, db=Depends(get_db)):
+    check_relationship_type(relationship.relationship_type)
+    query = f"""
+    MATCH (source:User) WHERE id(source) = $source_id
+    MATCH (target:User) WHERE id(target) = $target_id
+    MERGE (source)-[r:{relationship.relationship_type}]->(target)
     RETURN id(r) AS relationship_id
     """
     params = {
         "source_id": relationship.source_id,
         "target_id": relationship.target_id,
-        "relationship_type": relationship.relationship_type
     }
 
-    formatted_query = query.replace("{relationship_type}", relationship.relationship_type)
-
-    result = db.run(formatted_query, **params).single()
+    records = await db.run(query, **params)
+    result = await records.single()
     if not result:
         raise HTTPException(status_code=404, detail="Nodes not found or relationship creation failed")
     return {"relationship_id": result["relationship_id"]}
 
 
+@app.post("/relationships/bulk", response_model=BulkRelationshipResult)
+async def create_relationships_bulk(relationships: List[RelationshipCreate], db=Depends(get_db)):
+    """
+    Create many relationships with one UNWIND query per relationship type and chunk,
+    each chunk in its own transaction. Edges whose type is not allowed, whose nodes
+    do not exist, or whose chunk failed are reported by their index in the request.
+    Edges are merged, so resending a chunk does not duplicate them; `created` counts
+    only the edges that did not exist yet.
+    """
+    failures = []
+    by_type = {}
+    for index, relationship in enumerate(relationships):
+        if relationship.relationship_type not in ALLOWED_RELATIONSHIP_TYPES:
+            failures.append({"index": index,
+                             "detail": f"Relationship type '{relationship.relationship_type}' is not allowed"})
+            continue
+        by_type.setdefault(relationship.relationship_type, []).append(
+            {"index": index, "source_id": relationship.source_id, "target_id": relationship.target_id}
+        )
+
+    created = 0
+    for relationship_type, rels in by_type.items():
+        query = f"""
+        UNWIND $rels AS rel
+        MATCH (source:User) WHERE id(source) = rel.source_id
+        MATCH (target:User) WHERE id(target) = rel.target_id
+        MERGE (source)-[:{relationship_type}]->(target)
+        RETURN rel.index AS index
+        """
+        for start in range(0, len(rels), RELATIONSHIP_BATCH_SIZE):
+            chunk = rels[start:start + RELATIONSHIP_BATCH_SIZE]
+            try:
+                written, chunk_created = await db.execute_write(create_relationship_batch, query, chunk)
+            except Neo4jError as e:
+                failures.extend({"index": rel["index"], "detail": f"Batch failed: {e}"} for rel in chunk)
+                continue
+            # From the server's counters: edges that already existed, or that an earlier
+            # row of the same chunk created, are merged but not counted.
+            created += chunk_created
+            failures.extend(
+                {"index": rel["index"], "detail": "Source or target user not found"}
+                for rel in chunk if rel["index"] not in written
+            )
+
+    failures.sort(key=lambda failure: failure["index"])
+    return {"created": created, "failures": failures}
+
+
 
 
 @app.delete("/relationships/")
-def delete_relationship(relationship: RelationshipDelete, db=Depends(get_db)):
-    query = """
-    MATCH (source)-[r:{relationship_type}]->(target)
+async def delete_relationship(relationship: RelationshipDelete, db=Depends(get_db)):
+    check_relationship_type(relationship.relationship_type)
+    query = f"""
+    MATCH (source:User)-[r:{relationship.relationship_type}]->(target:User)
     WHERE id(source) = $source_id AND id(target) = $target_id
     DELETE r
     """
     params = {
         "source_id": relationship.source_id,
         "target_id": relationship.target_id,
-        "relationship_type": relationship.relationship_type
     }
 
-    formatted_query = query.replace("{relationship_type}", relationship.relationship_type)
-
 
-    result = db.run(formatted_query, **params)
+    result = await db.run(query, **params)
 
 
-    summary = result.consume()
+    summary = await result.consume()
     if summary.counters.relationships_deleted == 0:
         raise HTTPException(status_code=404, detail="Relationship not found")
 
     return {
         "message": f"Relationship of type '{relationship.relationship_type}' between nodes {relationship.source_id} and {relationship.target_id} has been successfully deleted."
     }
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await driver.close()
@@ -0,0 +1,273 @@
+"""
+Streaming bulk import of users, posts, FOLLOW and LIKE edges into the social graph.
+
+Input is CSV (with a header row) or NDJSON, parsed line by line as it arrives and
+written as UNWIND batches by a pool of concurrent writers. Used by the /import
+routes in app.py, and runnable on its own:
+
+    python social_import.py users users.csv
+    python social_import.py follows follows.ndjson --batch-size 5000 --workers 8
+"""
+import argparse
+import asyncio
+import csv
+import json
+import sys
+import time
+from datetime import datetime, timezone
+
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_WORKERS = 4
+MAX_REPORTED_ERRORS = 100
+
+FIELDS = {
+    "users": ("id", "name"),
+    "posts": ("id", "content", "timestamp"),
+    "follows": ("follower_id", "followee_id"),
+    "likes": ("user_id", "post_id"),
+}
+# Passed through as null when absent or empty.
+OPTIONAL_FIELDS = {
+    "posts": ("author_id",),
+}
+
+
+def as_utc(value: datetime) -> datetime:
+    # Naive timestamps are taken as UTC, so every stored value is comparable.
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def parse_timestamp(value):
+    # Parsed as POST /posts does, so both paths accept the same values and the
+    # driver is handed a native datetime; raises ValueError/TypeError on bad input.
+    return as_utc(datetime.fromisoformat(value))
+
+
+# Converted per row, so one bad value rejects its own line rather than a whole batch.
+PARSERS = {
+    "posts": {"timestamp": parse_timestamp},
+}
+
+# Every statement returns how many rows it wrote, so edges whose endpoints are
+# missing can be counted as failed. Edge writes bump the app.py node counters only
+# when the edge is new, and also return those rows as `created`. timestamp() is fixed
+# for the whole query, so a row repeated in the batch also sees its edge as new;
+# DISTINCT keeps it to one entry.
+QUERIES = {
+    "users": """
+        UNWIND $rows AS row
+        MERGE (u:User {id: row.id})
+        SET u.name = row.name
+        RETURN count(*) AS written
+    """,
+    "posts": """
+        UNWIND $rows AS row
+        MERGE (p:Post {id: row.id})
+        SET p.content = row.content, p.timestamp = row.timestamp
+        WITH row, p
+        OPTIONAL MATCH (author:User {id: row.author_id})
+        FOREACH (_ IN CASE WHEN author IS NULL THEN [] ELSE [1] END | MERGE (author)-[:POSTED]->(p))
+        RETURN count(*) AS written
+    """,
+    "follows": """
+        UNWIND $rows AS row
+        MATCH (follower:User {id: row.follower_id})
+        MATCH (followee:User {id: row.followee_id})
+        MERGE (follower)-[r:FOLLOW]->(followee)
+        ON CREATE SET r.created_at = timestamp(),
+                      follower.following_count = coalesce(follower.following_count, 0) + 1,
+                      followee.follower_count = coalesce(followee.follower_count, 0) + 1
+        RETURN count(*) AS written, collect(DISTINCT CASE WHEN r.created_at = timestamp() THEN row END) AS created
+    """,
+    "likes": """
+        UNWIND $rows AS row
+        MATCH (user:User {id: row.user_id})
+        MATCH (post:Post {id: row.post_id})
+        MERGE (user)-[r:LIKE]->(post)
+        ON CREATE SET r.created_at = timestamp(), post.like_count = coalesce(post.like_count, 0) + 1
+        RETURN count(*) AS written, collect(DISTINCT CASE WHEN r.created_at = timestamp() THEN row END) AS created
+    """,
+}
+
+
+class ImportStats:
+    def __init__(self, kind):
+        self.kind = kind
+        self.rows = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+    def error(self, line, detail):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "detail": detail})
+
+    def as_dict(self):
+        seconds = time.perf_counter() - self.started
+        return {
+            "kind": self.kind,
+            "rows": self.rows,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(self.written / seconds, 1) if seconds else 0.0,
+            "errors": self.errors,
+        }
+
+
+async def iter_lines(chunks):
+    """
+    Split an async iterator of byte chunks into decoded lines without buffering the whole input.
+    """
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8").rstrip("\r")
+    if buffer:
+        yield buffer.decode("utf-8").rstrip("\r")
+
+
+async def iter_rows(lines, fmt, kind, stats):
+    """
+    Yield (line_number, row) for every valid input row; invalid ones are recorded on stats.
+    CSV quoting is supported within a line, but not quoted fields spanning lines.
+    """
+    fields = FIELDS[kind]
+    optional = OPTIONAL_FIELDS.get(kind, ())
+    parsers = PARSERS.get(kind, {})
+    header = None
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        if fmt == "csv":
+            values = next(csv.reader([line]))
+            if header is None:
+                header = values
+                continue
+            row = dict(zip(header, values))
+        else:
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                stats.rows += 1
+                stats.error(line_number, f"Invalid JSON: {e}")
+                continue
+        stats.rows += 1
+        if not isinstance(row, dict) or any(row.get(field) in (None, "") for field in fields):
+            stats.error(line_number, f"Row must have {', '.join(fields)}")
+            continue
+        values = {field: row[field] for field in fields}
+        values.update((field, row.get(field) or None) for field in optional)
+        try:
+            for field, parse in parsers.items():
+                values[field] = parse(values[field])
+        except (TypeError, ValueError):
+            stats.error(line_number, f"Invalid {field}: {values[field]!r}")
+            continue
+        yield line_number, values
+
+
+async def write_batch(tx, query, rows):
+    result = await tx.run(query, rows=rows)
+    record = await result.single()
+    return record["written"] if record else 0
+
+
+async def import_rows(driver, kind, rows, batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_WORKERS,
+                      stats=None, progress=None):
+    """
+    Write `rows` (an async iterator from iter_rows) in UNWIND batches of `batch_size`
+    with `workers` concurrent writers, each batch in its own transaction. `progress`,
+    if given, is called with the stats after every batch.
+    """
+    stats = stats or ImportStats(kind)
+    query = QUERIES[kind]
+    # Bounded, so a fast reader cannot run ahead of the writers and fill memory.
+    queue = asyncio.Queue(maxsize=workers * 2)
+
+    async def writer():
+        async with driver.session() as session:
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    return
+                line_numbers, batch_rows = zip(*batch)
+                try:
+                    written = await session.execute_write(write_batch, query, list(batch_rows))
+                except Exception as e:
+                    for line_number in line_numbers:
+                        stats.error(line_number, f"Batch failed: {e}")
+                    continue
+                stats.batches += 1
+                stats.written += written
+                if written < len(batch_rows):
+                    stats.failed += len(batch_rows) - written
+                if progress is not None:
+                    progress(stats)
+
+    tasks = [asyncio.create_task(writer()) for _ in range(workers)]
+    try:
+        batch = []
+        async for item in rows:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                await queue.put(batch)
+                batch = []
+        if batch:
+            await queue.put(batch)
+        for _ in tasks:
+            await queue.put(None)
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+    return stats
+
+
+async def read_file(path, chunk_size=1 << 16):
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+
+def print_progress(stats):
+    seconds = time.perf_counter() - stats.started
+    print(f"\r{stats.kind}: {stats.written} written, {stats.failed} failed, "
+          f"{stats.written / seconds:.0f} rows/s", end="", file=sys.stderr, flush=True)
+
+
+async def run_cli(args):
+    from app import driver
+
+    fmt = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    stats = ImportStats(args.kind)
+    rows = iter_rows(iter_lines(read_file(args.path)), fmt, args.kind, stats)
+    try:
+        await import_rows(driver, args.kind, rows, args.batch_size, args.workers, stats, print_progress)
+    finally:
+        await driver.close()
+    print(file=sys.stderr)
+    print(json.dumps(stats.as_dict(), indent=2))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import into the social graph.")
+    parser.add_argument("kind", choices=sorted(FIELDS))
+    parser.add_argument("path", help="CSV (with header) or NDJSON file")
+    parser.add_argument("--format", choices=("csv", "ndjson"), help="default: from the file extension")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    asyncio.run(run_cli(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Per-user home timelines for app.py, maintained by fan-out-on-write.
+
+A timeline is a bounded list of (timestamp, post_id, author_id) entries kept in
+ascending order, so a page is a bisect plus a slice: O(log n + page size). At most
+`max_users` timelines are kept, least recently used first out; an evicted one is
+simply rebuilt from the graph on its next read.
+"""
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import OrderedDict
+
+
+class TimelineStore(ABC):
+    """
+    Interface the feed is written against, so timelines can move to a shared
+    store (e.g. Redis sorted sets) without changing app.py.
+    """
+
+    @abstractmethod
+    def contains(self, key):
+        ...
+
+    @abstractmethod
+    def add(self, key, entry):
+        ...
+
+    def add_many(self, keys, entry):
+        for key in keys:
+            self.add(key, entry)
+
+    @abstractmethod
+    def load(self, key, entries):
+        ...
+
+    @abstractmethod
+    def discard(self, key):
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+    @abstractmethod
+    def page(self, key, before=None, limit=20):
+        ...
+
+
+class InMemoryTimelineStore(TimelineStore):
+    def __init__(self, max_length=800, max_users=100000):
+        self.max_length = max_length
+        self.max_users = max_users
+        self._timelines = OrderedDict()
+
+    def contains(self, key):
+        return key in self._timelines
+
+    def _store(self, key, timeline):
+        self._timelines[key] = timeline
+        self._timelines.move_to_end(key)
+        while len(self._timelines) > self.max_users:
+            self._timelines.popitem(last=False)
+
+    def add(self, key, entry):
+        timeline = self._timelines.get(key)
+        if timeline is None:
+            timeline = []
+            self._store(key, timeline)
+        if timeline and entry <= timeline[0] and len(timeline) >= self.max_length:
+            return  # older than everything kept
+        index = bisect_left(timeline, entry)
+        if index < len(timeline) and timeline[index] == entry:
+            return  # set semantics, so a retried fan-out is harmless
+        timeline.insert(index, entry)
+        if len(timeline) > self.max_length:
+            del timeline[0]
+
+    def load(self, key, entries):
+        self._store(key, sorted(set(entries))[-self.max_length:])
+
+    def discard(self, key):
+        self._timelines.pop(key, None)
+
+    def clear(self):
+        self._timelines.clear()
+
+    def page(self, key, before=None, limit=20):
+        """
+        Newest first, strictly older than `before` (a (timestamp, post_id) pair) when given.
+        """
+        timeline = self._timelines.get(key, [])
+        if key in self._timelines:
+            self._timelines.move_to_end(key)
+        end = bisect_left(timeline, tuple(before)) if before is not None else len(timeline)
+        return timeline[max(0, end - limit):end][::-1]
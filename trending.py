@@ -0,0 +1,108 @@
+"""
+Sliding-window like counts and top-K posts for app.py's /posts/trending.
+
+Likes are counted in fixed time buckets. Each window keeps running per-post
+totals plus its current top `max_k` posts, updated on every like, so a read only
+sorts at most max_k entries. When a bucket slides out of a window its counts are
+subtracted and that window's top-K is rebuilt with a heap over the totals, once
+per bucket. Memory is bounded by the posts liked within the largest window, not
+by the number of posts.
+"""
+import heapq
+import time
+from operator import itemgetter
+
+
+class SlidingTopK:
+    def __init__(self, windows, bucket_seconds=60, max_k=100, clock=time.time):
+        """
+        `windows` maps a window name (e.g. "1h") to its length in seconds.
+        """
+        self.bucket_seconds = bucket_seconds
+        self.max_k = max_k
+        self.clock = clock
+        self.spans = {name: max(1, int(seconds // bucket_seconds)) for name, seconds in windows.items()}
+        self.max_span = max(self.spans.values())
+        self.buckets = {}  # bucket index -> {post_id: likes}
+        self.totals = {name: {} for name in windows}
+        self.top = {name: {} for name in windows}
+        self.weakest = {name: None for name in windows}  # lowest post in a full top, None when unknown
+        self.ranked = {name: [] for name in windows}  # top sorted for reads, rebuilt lazily
+        self.current = self._index(clock())
+
+    def _index(self, timestamp):
+        return int(timestamp // self.bucket_seconds)
+
+    def add(self, post_id, timestamp=None, count=1):
+        now = self._index(self.clock())
+        self._advance(now)
+        index = now if timestamp is None else min(self._index(timestamp), now)
+        if index <= now - self.max_span:
+            return
+        bucket = self.buckets.setdefault(index, {})
+        bucket[post_id] = bucket.get(post_id, 0) + count
+        for name, span in self.spans.items():
+            if index > now - span:
+                totals = self.totals[name]
+                totals[post_id] = totals.get(post_id, 0) + count
+                self._offer(name, post_id, totals[post_id])
+
+    def _offer(self, name, post_id, likes):
+        top = self.top[name]
+        if post_id in top or len(top) < self.max_k:
+            top[post_id] = likes
+            if post_id == self.weakest[name] or len(top) < self.max_k:
+                self.weakest[name] = None
+        else:
+            weakest = self.weakest[name]
+            if weakest is None:
+                weakest = self.weakest[name] = min(top, key=top.get)
+            if likes <= top[weakest]:
+                return
+            del top[weakest]
+            top[post_id] = likes
+            self.weakest[name] = None
+        self.ranked[name] = None
+
+    def _advance(self, now):
+        if now <= self.current:
+            return
+        if now - self.current >= self.max_span:
+            # Idle for longer than the largest window: nothing is left in any of them.
+            self.clear()
+            self.current = now
+            return
+        while self.current < now:
+            self.current += 1
+            for name, span in self.spans.items():
+                leaving = self.buckets.get(self.current - span)
+                if leaving:
+                    totals = self.totals[name]
+                    for post_id, likes in leaving.items():
+                        remaining = totals.get(post_id, 0) - likes
+                        if remaining > 0:
+                            totals[post_id] = remaining
+                        else:
+                            totals.pop(post_id, None)
+            self.buckets.pop(self.current - self.max_span, None)
+        for name in self.spans:
+            self.top[name] = dict(heapq.nlargest(self.max_k, self.totals[name].items(), key=itemgetter(1)))
+            self.weakest[name] = None
+            self.ranked[name] = None
+
+    def trending(self, name, k):
+        """
+        The `k` most-liked posts in window `name` as (post_id, likes), most liked first.
+        """
+        self._advance(self._index(self.clock()))
+        if self.ranked[name] is None:
+            self.ranked[name] = sorted(self.top[name].items(), key=lambda item: (-item[1], item[0]))
+        return self.ranked[name][:k]
+
+    def clear(self):
+        self.buckets.clear()
+        for name in self.spans:
+            self.totals[name].clear()
+            self.top[name].clear()
+            self.weakest[name] = None
+            self.ranked[name] = None
@@ -0,0 +1,157 @@
+"""
+Write-behind buffering of FOLLOW and LIKE writes for app.py.
+
+Routes enqueue a row and return; a background flusher drains the queue, drops
+duplicate rows, and writes what is left as UNWIND batches (the same MERGE
+statements as the bulk import) whenever `batch_size` rows are pending or
+`flush_interval` seconds have passed since the first of them. Anything that must
+follow the write itself, rather than the request, goes in `on_written`.
+"""
+import asyncio
+import logging
+import time
+
+from social_import import QUERIES
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteBehindFull(Exception):
+    """The queue stayed full for longer than the enqueue timeout."""
+
+
+async def write_rows(tx, query, rows):
+    result = await tx.run(query, rows=rows)
+    record = await result.single()
+    return (record["written"], record["created"]) if record else (0, [])
+
+
+class WriteBehind:
+    def __init__(self, get_session, max_size=10000, batch_size=500, flush_interval=0.05, enqueue_timeout=1.0,
+                 on_written=None):
+        """
+        `on_written(kind, rows, created)`, if given, is called after each batch is
+        committed with the rows written and the subset that created a new edge.
+        """
+        self.get_session = get_session
+        self.on_written = on_written
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.queue = asyncio.Queue(maxsize=max_size)
+        self._task = None
+        self.enqueued = 0
+        self.rejected = 0
+        self.coalesced = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.flush_seconds_total = 0.0
+        self.flush_seconds_max = 0.0
+        self.last_flush_seconds = 0.0
+
+    async def submit(self, kind, row):
+        """
+        Queue one `kind` row ("follows" or "likes"), waiting up to enqueue_timeout
+        for room; raises WriteBehindFull if there is none.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self.queue.put((kind, row)), self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise WriteBehindFull(f"Write queue is full ({self.queue.maxsize} pending)")
+        self.enqueued += 1
+
+    async def close(self):
+        """
+        Stop accepting work once everything already queued has been written.
+        """
+        if self._task is None:
+            return
+        await self.queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is _STOP:
+                return
+            pending = {}
+            self._add(pending, item)
+            deadline = loop.time() + self.flush_interval
+            while len(pending) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                self._add(pending, item)
+            await self._flush(pending)
+
+    def _add(self, pending, item):
+        kind, row = item
+        key = (kind, *row.values())
+        if key in pending:
+            self.coalesced += 1
+        else:
+            pending[key] = item
+
+    async def _flush(self, pending):
+        by_kind = {}
+        for kind, row in pending.values():
+            by_kind.setdefault(kind, []).append(row)
+        start = time.perf_counter()
+        try:
+            async with self.get_session() as session:
+                for kind, rows in by_kind.items():
+                    try:
+                        written, created = await session.execute_write(write_rows, QUERIES[kind], rows)
+                    except Exception:
+                        logger.exception("Write-behind flush of %d %s failed", len(rows), kind)
+                        self.failed += len(rows)
+                        continue
+                    self.written += written
+                    # Rows whose user or post does not exist match nothing and are dropped.
+                    self.dropped += len(rows) - written
+                    if self.on_written is not None:
+                        try:
+                            self.on_written(kind, rows, created)
+                        except Exception:
+                            logger.exception("Write-behind on_written for %s failed", kind)
+        except Exception:
+            logger.exception("Write-behind flush failed")
+            self.failed += len(pending)
+        seconds = time.perf_counter() - start
+        self.batches += 1
+        self.last_flush_seconds = seconds
+        self.flush_seconds_total += seconds
+        self.flush_seconds_max = max(self.flush_seconds_max, seconds)
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "enqueued": self.enqueued,
+            "rejected": self.rejected,
+            "coalesced": self.coalesced,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": self.batches,
+            "flush_ms_last": round(self.last_flush_seconds * 1000, 3),
+            "flush_ms_avg": round(self.flush_seconds_total / self.batches * 1000, 3) if self.batches else 0.0,
+            "flush_ms_max": round(self.flush_seconds_max * 1000, 3),
+        }